@@ -0,0 +1,136 @@
+import re
+from dataclasses import dataclass, field
+
+# The block's tags sit on their own lines; the prompt also mentions
+# "<activities> block" inline
+BLOCK_PATTERN = re.compile(r"^<activities>\n(.*?)^</activities>", re.S | re.M)
+ITEM_PATTERN = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$")
+FIELD_PATTERN = re.compile(r"^\s*\*\s+\*\*(\w+):\*\*\s*(.*?)\s*$")
+BULLET_PATTERN = re.compile(r"^\s*\*\s+(.+?)\s*$")
+SELECTION_PATTERN = re.compile(r"ACTIVITIES:\s*([\d,\s]+)", re.IGNORECASE)
+INTRO_PATTERN = re.compile(r"INTRO:\s*(.+)", re.IGNORECASE)
+
+REFLECTION = '**Invite reflection:** Ask "What did you notice?" or "How did that feel?"'
+
+
+@dataclass
+class Activity:
+    number: int
+    name: str
+    # Ordered label -> text, e.g. {"Focus": ..., "How": ..., "Goal": ...}
+    fields: dict = field(default_factory=dict)
+
+    @property
+    def summary(self):
+        return self.fields.get("Focus") or self.fields.get("Goal") or ""
+
+    def to_prompt(self):
+        lines = [f"{self.number}. {self.name}"]
+        for label, text in self.fields.items():
+            text = text.replace("\n  - ", "\n  * ")
+            lines.append(f"* **{label}:** {text}")
+        return "\n".join(lines)
+
+    def to_markdown(self):
+        lines = [f"### {self.name}"]
+        for label, text in self.fields.items():
+            lines.append(f"- **{label}:** {text}")
+        return "\n".join(lines)
+
+
+def parse_catalog(prompt):
+    """Parse the numbered activities in a prompt's <activities> block."""
+    block = BLOCK_PATTERN.search(prompt).group(1)
+    activities = []
+
+    for line in block.splitlines():
+        item = ITEM_PATTERN.match(line)
+        if item:
+            activities.append(Activity(int(item.group(1)), item.group(2)))
+            continue
+
+        if not activities:
+            continue
+        current = activities[-1]
+
+        labelled = FIELD_PATTERN.match(line)
+        if labelled:
+            current.fields[labelled.group(1)] = labelled.group(2)
+            continue
+
+        # Sub-bullets (like the scavenger hunt list) belong to the last field
+        bullet = BULLET_PATTERN.match(line)
+        if bullet and current.fields:
+            label = next(reversed(current.fields))
+            current.fields[label] += f"\n  - {bullet.group(1)}"
+
+    return activities
+
+
+def restrict_prompt(prompt, activities):
+    """Copy of ``prompt`` whose <activities> block only lists ``activities``."""
+    listing = "\n".join(activity.to_prompt() for activity in activities)
+    block = BLOCK_PATTERN.search(prompt)
+    return (f"{prompt[:block.start()]}<activities>\n{listing}\n</activities>"
+            f"{prompt[block.end():]}")
+
+
+def build_selection_prompt(activities):
+    """
+    Prompt asking the model to pick activity numbers and write one intro
+    line, instead of rewriting the activity descriptions.
+    """
+    listing = "\n".join(
+        f"{activity.number}. {activity.name} - {activity.summary}"
+        for activity in activities
+    )
+    return f"""
+Guide the user into a mindfulness meditation session by choosing 2 or 3 kid-friendly activities
+from the numbered list below that best fit the image provided.
+
+<activities>
+{listing}
+</activities>
+
+Reply with exactly two lines and nothing else:
+ACTIVITIES: <numbers of the chosen activities, comma separated>
+INTRO: <one short, playful sentence inviting the family to begin>
+"""
+
+
+def parse_selection(text, activities):
+    """
+    Parse a structured reply into ``(activities, intro)``. Returns ``None``
+    when no valid activity number could be found.
+    """
+    match = SELECTION_PATTERN.search(text)
+    if not match:
+        return None
+
+    by_number = {activity.number: activity for activity in activities}
+    chosen = []
+    for number in re.findall(r"\d+", match.group(1)):
+        activity = by_number.get(int(number))
+        if activity is not None and activity not in chosen:
+            chosen.append(activity)
+    if not chosen:
+        return None
+
+    intro = INTRO_PATTERN.search(text)
+    return chosen, intro.group(1).strip() if intro else ""
+
+
+def render_selection(chosen, intro):
+    """Markdown for the activities screen, built from the catalog."""
+    parts = [intro] if intro else []
+    parts += [activity.to_markdown() for activity in chosen]
+    parts.append(REFLECTION)
+    return "\n\n".join(parts)
+
+
+def mentioned_activities(text, activities):
+    """Catalog activities whose name appears in ``text``, in catalog order."""
+    text = text.lower()
+    # "Barefoot walk (if safe)" should match a reply that says "Barefoot walk"
+    names = [re.sub(r"\s*\(.*?\)", "", activity.name).lower() for activity in activities]
+    return [activity for activity, name in zip(activities, names) if name in text]
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+import metrics
+
+
+class Busy(Exception):
+    """Raised when the inference queue is full."""
+
+
+class Ticket:
+    def __init__(self, queue, session_id):
+        self.queue = queue
+        self.session_id = session_id
+        self.queued_at = time.perf_counter()
+        self.granted = False
+
+    def position(self):
+        """
+        This request's place in line, 1 for the next one to run, or 0 once
+        it is running.
+        """
+        return self.queue.position(self)
+
+    def wait(self):
+        """Block until this ticket may use the model."""
+        self.queue.wait(self)
+
+    def release(self):
+        self.queue.release(self)
+
+
+class FairQueue:
+    """
+    Bounded admission queue in front of the model.
+
+    At most ``concurrency`` requests run at once and at most ``max_depth``
+    wait; anything beyond that is rejected right away with ``Busy``. Free
+    slots go round-robin across sessions, so one family clicking "Start
+    Session" repeatedly can't starve the others.
+    """
+
+    def __init__(self, concurrency=2, max_depth=16):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.running = 0
+        # session id -> deque of waiting tickets, in round-robin order
+        self._waiting = OrderedDict()
+        self._depth = 0
+        self._condition = threading.Condition()
+
+    def enter(self, session_id):
+        """Queue a request for ``session_id``; raises ``Busy`` if full."""
+        with self._condition:
+            # Only requests that would have to wait count against max_depth
+            if self.running >= self.concurrency and self._depth >= self.max_depth:
+                metrics.QUEUE_REJECTIONS.inc()
+                raise Busy()
+
+            ticket = Ticket(self, session_id)
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            self._depth += 1
+            self._grant()
+            metrics.QUEUE_DEPTH.set(self._depth)
+            return ticket
+
+    def _grant(self):
+        while self.running < self.concurrency and self._waiting:
+            session_id, tickets = next(iter(self._waiting.items()))
+            ticket = tickets.popleft()
+            # Move the session to the back so other sessions go next
+            del self._waiting[session_id]
+            if tickets:
+                self._waiting[session_id] = tickets
+
+            ticket.granted = True
+            self.running += 1
+            self._depth -= 1
+            metrics.STAGE_SECONDS.observe(
+                time.perf_counter() - ticket.queued_at, stage="queue_wait")
+        self._condition.notify_all()
+
+    def position(self, ticket):
+        with self._condition:
+            if ticket.granted:
+                return 0
+            # Round-robin order: count the tickets that will be granted first
+            ahead = 0
+            rounds = [list(tickets) for tickets in self._waiting.values()]
+            for depth in range(max(map(len, rounds), default=0)):
+                for tickets in rounds:
+                    if depth < len(tickets):
+                        if tickets[depth] is ticket:
+                            return ahead + 1
+                        ahead += 1
+            return ahead
+
+    def wait(self, ticket):
+        with self._condition:
+            self._condition.wait_for(lambda: ticket.granted)
+
+    def release(self, ticket):
+        with self._condition:
+            if ticket.granted:
+                self.running -= 1
+            else:
+                # Abandoned while waiting
+                tickets = self._waiting.get(ticket.session_id)
+                if tickets is not None and ticket in tickets:
+                    tickets.remove(ticket)
+                    self._depth -= 1
+                    if not tickets:
+                        del self._waiting[ticket.session_id]
+            self._grant()
+            metrics.QUEUE_DEPTH.set(self._depth)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "running": self.running,
+                "waiting": self._depth,
+                "sessions_waiting": len(self._waiting),
+            }
@@ -1,28 +1,290 @@
-import gradio as gr
+import contextlib
+import os
 import time
+import uuid
 
-from gemma_server import call_gemma, ZEN_IMG_PROMPT, ZEN_IMG_PROMPT_v2
+APP_STARTED = time.perf_counter()
 
-def generate_mindfulness_activities(description, audio, image):
+import gradio as gr
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+import metrics
+from activity_catalog import mentioned_activities, parse_selection, render_selection
+from admission import Busy, FairQueue
+from feedback_log import FeedbackLog
+from gemma_server import (
+    ACTIVITY_CATALOG,
+    ACTIVITY_TOP_K,
+    call_gemma,
+    count_tokens,
+    generation_params,
+    model_holder,
+    RESPONSE_MODE,
+    stream_gemma,
+    STRUCTURED_MAX_NEW_TOKENS,
+    ZEN_AUDIO_PROMPT,
+    ZEN_IMG_PROMPT,
+    ZEN_IMG_PROMPT_STRUCTURED,
+    ZEN_IMG_PROMPT_v2,
+)
+from response_cache import ResponseCache, file_sha256
+from scene_retrieval import ActivityRetriever, classify_scene
+from session_store import SessionStore
+from worker_pool import WorkerPool
+
+# Comma-separated inference worker URLs (python gemma_server.py --port N).
+# When set, this process only serves the UI and never loads the model.
+WORKER_URLS = [url for url in os.environ.get("ZEN_WORKERS", "").split(",") if url]
+worker_pool = WorkerPool(WORKER_URLS) if WORKER_URLS else None
+
+activity_retriever = ActivityRetriever(
+    ACTIVITY_CATALOG, top_k=ACTIVITY_TOP_K,
+    # Counting tokens needs the tokenizer, which only the workers load
+    count_tokens=None if worker_pool else count_tokens
+)
+
+# At most ZEN_INFERENCE_CONCURRENCY sessions generate at once and at most
+# ZEN_QUEUE_DEPTH wait for their turn; more than that get a "busy" message
+inference_queue = FairQueue(
+    concurrency=int(os.environ.get("ZEN_INFERENCE_CONCURRENCY", "2")),
+    max_depth=int(os.environ.get("ZEN_QUEUE_DEPTH", "16")),
+)
+
+BUSY_MESSAGE = (
+    "Lots of families are recharging right now! "
+    "Please take a slow, deep breath and try again in a minute."
+)
+
+# Set ZEN_RESPONSE_CACHE=0 to always run a full generation
+RESPONSE_CACHE_ENABLED = os.environ.get("ZEN_RESPONSE_CACHE", "1") != "0"
+
+response_cache = ResponseCache(
+    os.environ.get("ZEN_RESPONSE_CACHE_DIR", ".cache/responses"),
+    max_disk_bytes=int(os.environ.get("ZEN_RESPONSE_CACHE_MAX_MB", "100")) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get("ZEN_RESPONSE_CACHE_TTL_HOURS", "168")) * 3600,
+    # Perceptual hashing lets re-encoded copies of the same photo hit
+    perceptual=os.environ.get("ZEN_RESPONSE_CACHE_PHASH", "0") == "1",
+) if RESPONSE_CACHE_ENABLED else None
+
+
+def model_ready():
+    return worker_pool.ready() if worker_pool else model_holder.ready
+
+
+def run_model(request):
+    """``call_gemma`` locally, or on the least busy worker."""
+    if worker_pool:
+        return worker_pool.call(request)
+    return call_gemma(**request)
+
+
+def stream_model(request):
+    """``stream_gemma`` locally, or on the least busy worker."""
+    if worker_pool:
+        return worker_pool.stream(request)
+    return stream_gemma(**request)
+
+
+# Past sessions and their feedback, for the History and Favorites tabs
+session_store = SessionStore(os.environ.get("ZEN_SESSION_DB", ".cache/sessions.db"))
+feedback_log = FeedbackLog(session_store)
+
+HISTORY_PAGE_SIZE = 10
+
+FEEDBACK_LABELS = {"better": "😊 Felt better", "same": "🥱 Felt the same"}
+
+
+def prompt_version(image, audio=None):
+    """Label for the prompt a request used, for feedback analytics."""
     if image:
-        if description:
-            message = f"""{description}\n\n{ZEN_IMG_PROMPT_v2}"""
-        else:
-            message = ZEN_IMG_PROMPT_v2
-    elif description:
-        message = description
+        version = f"v2-{RESPONSE_MODE}"
+    elif audio:
+        version = "v2-audio"
     else:
-        raise ValueError("Please provide at least a description or an image.")
-    
-    response = call_gemma(
-        message=message,
+        return "text_only"
+    if ACTIVITY_TOP_K > 0:
+        version += f"-top{ACTIVITY_TOP_K}"
+    return version
+
+
+def session_details(response):
+    """Names of the catalog activities suggested in ``response``."""
+    return [activity.name
+            for activity in mentioned_activities(response, ACTIVITY_CATALOG)]
+
+
+EMPTY_REQUEST_MESSAGE = "Please provide a description, an image or audio."
+
+
+def build_request(description, audio, image, mode=RESPONSE_MODE):
+    if not image and not description and not audio:
+        raise ValueError(EMPTY_REQUEST_MESSAGE)
+
+    structured = bool(image) and mode == "structured"
+    # Audio alone still needs the activities to choose from
+    full_prompt = ZEN_IMG_PROMPT_v2 if image else ZEN_AUDIO_PROMPT
+    if not image and not audio:
+        prompt = None
+    elif ACTIVITY_TOP_K > 0:
+        scene = classify_scene(image, description)
+        prompt = activity_retriever.prompt_for(full_prompt, scene, structured)
+        print(f"Scene: {scene or 'unclear, sending the whole catalog'}")
+    elif structured:
+        prompt = ZEN_IMG_PROMPT_STRUCTURED
+    else:
+        prompt = full_prompt
+
+    # The activity prompt is passed separately so gemma_server can reuse
+    # its cached prefix and only prefill the image and description.
+    return dict(
+        message=description,
         image_path=image,
-        conversation_history=[]
+        conversation_history=[],
+        prompt=prompt,
+        max_new_tokens=STRUCTURED_MAX_NEW_TOKENS if structured else None,
+        audio_path=audio
     )
+
+
+def response_cache_key(request):
+    if response_cache is None:
+        return None
+    return response_cache.make_key(
+        request["message"], request["image_path"], request["prompt"],
+        generation_params(request["max_new_tokens"]), request["audio_path"]
+    )
+
+
+def record_prompt_savings(request, structured):
+    if request["prompt"] is None or ACTIVITY_TOP_K <= 0:
+        return
+    if structured:
+        full_prompt = ZEN_IMG_PROMPT_STRUCTURED
+    elif request["image_path"]:
+        full_prompt = ZEN_IMG_PROMPT_v2
+    else:
+        full_prompt = ZEN_AUDIO_PROMPT
+    counts = activity_retriever.record(full_prompt, request["prompt"])
+    if counts is None:
+        return
+    before, after = counts
+    print(f"Prompt tokens {before} -> {after}: {activity_retriever.stats()}")
+
+
+def generate_structured_activities(request):
+    """
+    Run a structured request and render the chosen activities, or return
+    ``None`` if the model's reply can't be parsed.
+    """
+    reply = run_model(request)
+    selection = parse_selection(reply, ACTIVITY_CATALOG)
+    if selection is None:
+        print(f"Could not parse structured reply, falling back: {reply!r}")
+        return None
+    return render_selection(*selection)
+
+
+def generate_mindfulness_activities(description, audio, image):
+    request = build_request(description, audio, image)
+    key = response_cache_key(request)
+    if key is not None:
+        cached = cached_response(key)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    response = None
+    structured = bool(image) and RESPONSE_MODE == "structured"
+    if structured:
+        response = generate_structured_activities(request)
+    if response is None:
+        structured = False
+        request = build_request(description, audio, image, mode="freeform")
+        response = run_model(request)
+    record_prompt_savings(request, structured)
+
+    if key is not None:
+        response_cache.put(key, response, time.perf_counter() - start)
     
     return response
 
 
+def cached_activities(description, audio, image):
+    """The cached activities for these inputs, or ``None``."""
+    key = response_cache_key(build_request(description, audio, image))
+    if key is None:
+        return None
+    return cached_response(key)
+
+
+def cached_response(key):
+    """Look ``key`` up in the response cache, logging its stats either way."""
+    cached = response_cache.get(key)
+    result = "miss" if cached is None else "hit"
+    print(f"Response cache {result}: {response_cache.stats()}")
+    return cached
+
+
+def stream_mindfulness_activities(description, audio, image, session_id=None):
+    """
+    Yield the activities text accumulated so far as it is generated. With a
+    ``session_id`` the model keeps the conversation around for follow-ups.
+    The response cache is checked by the caller, before queueing.
+    """
+    with metrics.stage("request_setup"):
+        request = build_request(description, audio, image)
+        key = response_cache_key(request)
+
+    start = time.perf_counter()
+    if bool(image) and RESPONSE_MODE == "structured":
+        # Structured replies are short, so render them in one go. They run
+        # without the session: follow-ups continue from the freeform prompt
+        # and rendered activities, not from this turn's KV cache, so the
+        # request is free to share a batch with others instead
+        response = generate_structured_activities(request)
+        if response is not None:
+            yield response
+            record_prompt_savings(request, structured=True)
+            if key is not None:
+                response_cache.put(key, response, time.perf_counter() - start)
+            return
+        request = build_request(description, audio, image, mode="freeform")
+
+    request["session_id"] = session_id
+    response = ""
+    # Closing the stream when this generator is closed stops generation
+    with contextlib.closing(stream_model(request)) as deltas:
+        for delta in deltas:
+            response += delta
+            yield response
+    record_prompt_savings(request, structured=False)
+
+    if key is not None:
+        response_cache.put(key, response, time.perf_counter() - start)
+
+
+def stream_follow_up(question, session, session_id=None):
+    """
+    Yield the answer to a follow-up ``question`` as it is generated.
+    ``session`` holds the first turn's inputs and the conversation so far;
+    the model only prefills the new question when it still has the
+    session's KV cache.
+    """
+    description, audio, image = session["inputs"]
+    request = build_request(description, audio, image, mode="freeform")
+    request.update(
+        message=question,
+        conversation_history=session["history"],
+        session_id=session_id,
+    )
+    response = ""
+    with contextlib.closing(stream_model(request)) as deltas:
+        for delta in deltas:
+            response += delta
+            yield response
+
 
 def create_input_screen():
     with gr.Column(visible=True, elem_id="input_row") as input_row:
@@ -58,9 +320,18 @@ def create_activities_screen():
         - 1 thing that you can taste safely
         """)
 
+        with gr.Row():
+            follow_up = gr.Textbox(
+                placeholder="Ask for changes, e.g. \"make it shorter\" or \"we're indoors now\"",
+                show_label=False,
+                scale=4
+            )
+            follow_up_button = gr.Button("Ask", scale=1)
+
         complete_button = gr.Button("Activities complete")
 
-    return activity_column, activities_content, complete_button
+    return (activity_column, activities_content, follow_up, follow_up_button,
+            complete_button)
 
 
 def create_feedback_drawer():
@@ -73,46 +344,271 @@ def create_feedback_drawer():
     return feedback_drawer, better_btn, same_btn
 
 
-def start_session(description, audio, image):
-    # Generate personalized activities using the stub method
-    activities_response = generate_mindfulness_activities(
-        description, audio, image
-    )
-    
+def admitted(request, api, stage, run):
+    """
+    Run the generator ``run(ticket)`` once the inference queue admits this
+    session. Turns requests away right away when the queue is full, before
+    any screen updates.
+    """
+    metrics.REQUESTS.inc(api=api)
+    try:
+        ticket = inference_queue.enter(request.session_hash if request else None)
+    except Busy:
+        raise gr.Error(BUSY_MESSAGE)
+
+    with metrics.stage(stage):
+        try:
+            yield from run(ticket)
+        except Exception:
+            metrics.ERRORS.inc(api=api)
+            raise
+        finally:
+            ticket.release()
+
+
+def start_session(description, audio, image, browser_id, request: gr.Request):
+    # Before leaving the input screen or taking a place in the queue
+    if not image and not description and not audio:
+        raise gr.Error(EMPTY_REQUEST_MESSAGE)
+    # A browser's first session picks its id, so the session is never
+    # recorded without one; every update below saves it in the browser
+    browser_id = browser_id or uuid.uuid4().hex
+
+    cached = cached_activities(description, audio, image)
+    if cached is not None:
+        # Needs no model time, so it doesn't wait in (or get turned away
+        # by) the inference queue
+        metrics.REQUESTS.inc(api="start_session")
+        updates = cached_session(description, audio, image, browser_id, cached)
+    else:
+        session_id = request.session_hash if request else None
+        updates = admitted(request, "start_session", "session", lambda ticket: (
+            stream_session(description, audio, image, ticket, session_id, browser_id)
+        ))
+    # Closed with this generator, so an abandoned session leaves the queue
+    with contextlib.closing(updates):
+        for update in updates:
+            yield (*update, browser_id)
+
+
+def cached_session(description, audio, image, browser_id, cached):
+    with metrics.stage("session"):
+        yield show_activities_screen(cached)
+        yield from show_activities(description, audio, image, browser_id,
+                                   iter([cached]))
+
+
+def ask_follow_up(question, session, request: gr.Request):
+    if not question or not session:
+        return
+    session_id = request.session_hash if request else None
+    yield from admitted(request, "follow_up", "follow_up", lambda ticket: (
+        stream_follow_up_answer(question, session, ticket, session_id)
+    ))
+
+
+def stream_session(description, audio, image, ticket, session_id=None,
+                   browser_id=None):
+    position = ticket.position()
+    if position:
+        status = (f"_You're number {position} in line, your activities will "
+                  "appear shortly..._")
+    elif not model_ready():
+        status = ("_Zenvironment is still waking up, your activities will "
+                  "appear in a moment..._")
+    else:
+        status = "_Preparing your activities..._"
+
+    # Swap screens right away, then fill in activities as they stream in
+    yield show_activities_screen(status)
+
+    ticket.wait()
+    yield from show_activities(description, audio, image, browser_id,
+                               stream_mindfulness_activities(
+                                   description, audio, image, session_id))
+
+
+def show_activities_screen(status):
     return (
         gr.update(visible=False),  # hide input
         gr.update(visible=True),   # show activities
-        gr.update(value=activities_response)  # update activities content
+        gr.update(value=status),
+        None                       # start a new conversation
+    )
+
+
+def show_activities(description, audio, image, browser_id, responses):
+    """
+    Show each of ``responses`` (the activities so far) as it comes, then
+    record the session and remember it for follow-ups.
+    """
+    start = time.perf_counter()
+    ttft = None
+    activities_response = ""
+    for activities_response in responses:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        yield (
+            gr.update(),
+            gr.update(),
+            gr.update(value=activities_response),  # update activities content
+            gr.update()
+        )
+
+    scene = classify_scene(image, description) if image else None
+    record_id = session_store.record_session(
+        activities_response,
+        browser_id=browser_id,
+        description=description,
+        image_sha256=file_sha256(image) if image else None,
+        audio_sha256=file_sha256(audio) if audio else None,
+        scene=scene,
+        mode=RESPONSE_MODE if image else "freeform",
+        ttft_seconds=ttft,
+        total_seconds=time.perf_counter() - start,
+    )
+
+    # Remember the conversation so follow-up questions can build on it
+    yield (gr.update(), gr.update(), gr.update(), {
+        "record_id": record_id,
+        "scene": scene,
+        "prompt_version": prompt_version(image, audio),
+        "activities": session_details(activities_response),
+        "inputs": (description, audio, image),
+        "history": [
+            {"role": "user", "content": description},
+            {"role": "assistant", "content": activities_response},
+        ],
+    })
+
+
+def stream_follow_up_answer(question, session, ticket, session_id=None):
+    yield (
+        gr.update(value=""),  # clear the question box
+        gr.update(value="_Thinking about your request..._"),
+        gr.update()
     )
 
+    ticket.wait()
+    answer = ""
+    for answer in stream_follow_up(question, session, session_id):
+        yield gr.update(), gr.update(value=answer), gr.update()
+
+    yield gr.update(), gr.update(), {
+        **session,
+        # Feedback is about the activities the family ended up with
+        "activities": session_details(answer) or session["activities"],
+        "history": session["history"] + [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer},
+        ],
+    }
+
 
 def complete_activities():
     return gr.update(visible=True)  # show feedback drawer
 
 
-def record_feedback():
-    print("✅ Feedback recorded")
-    return
+def record_feedback(feedback, session):
+    if session:
+        session_store.record_feedback(session["record_id"], feedback)
+        feedback_log.record(
+            session["record_id"], feedback,
+            activities=session["activities"],
+            scene=session["scene"],
+            prompt_version=session["prompt_version"],
+        )
+        print("✅ Feedback recorded")
+
+
+def render_sessions(rows, empty):
+    if not rows:
+        return empty
+    entries = []
+    for row in rows:
+        when = time.strftime("%b %d, %Y %H:%M", time.localtime(row["created_at"]))
+        details = [when]
+        if row["scene"]:
+            details.append(row["scene"])
+        if row["feedback"]:
+            details.append(FEEDBACK_LABELS.get(row["feedback"], row["feedback"]))
+        entries.append(f"#### {' · '.join(details)}\n\n{row['response']}")
+    return "\n\n---\n\n".join(entries)
+
+
+def sessions_page(query, empty, browser_id, cursor=None):
+    """
+    Render a page of ``query`` for ``browser_id`` and return it with the next
+    page's cursor.
+    """
+    rows, next_cursor = query(browser_id, cursor, limit=HISTORY_PAGE_SIZE)
+    if cursor is not None and not rows:
+        empty = "_No older sessions._"
+    return (
+        render_sessions(rows, empty),
+        next_cursor,
+        gr.update(visible=next_cursor is not None)
+    )
+
+
+def create_sessions_tab(query, empty, browser_id):
+    """
+    A list of this browser's past sessions, newest first, with an "Older"
+    button.
+    """
+    sessions = gr.Markdown(empty)
+    cursor = gr.State(None)
+    with gr.Row():
+        newest_button = gr.Button("Newest", size="sm")
+        older_button = gr.Button("Older", size="sm", visible=False)
+
+    def first_page(browser_id):
+        return sessions_page(query, empty, browser_id)
+
+    def next_page(cursor, browser_id):
+        return sessions_page(query, empty, browser_id, cursor)
+
+    outputs = [sessions, cursor, older_button]
+    newest_button.click(first_page, inputs=browser_id, outputs=outputs)
+    older_button.click(next_page, inputs=[cursor, browser_id], outputs=outputs)
+    return first_page, outputs
 
 
 with gr.Blocks(title="Time to Recharge") as demo:
     gr.Markdown("## 🌱 Time to recharge")
+    # Kept in the browser's local storage, so History and Favorites only
+    # show this family's sessions, across reloads. Set by its first session
+    browser_id = gr.BrowserState(None, storage_key="zen_browser_id")
 
     with gr.Tabs() as tabs:
         with gr.TabItem("Recharge activities", id="tab_recharge"):
             (input_row, description, audio, image,
              start_button) = create_input_screen()
-            (activity_column, activities_content,
+            (activity_column, activities_content, follow_up, follow_up_button,
              complete_button) = create_activities_screen()
             feedback_drawer, better_btn, same_btn = create_feedback_drawer()
+            # The first turn's inputs and the conversation so far
+            session_state = gr.State(None)
 
             # Bind session start
+            # inference_queue bounds concurrency, so Gradio shouldn't
             start_button.click(
                 fn=start_session,
-                inputs=[description, audio, image],
-                outputs=[input_row, activity_column, activities_content]
+                inputs=[description, audio, image, browser_id],
+                outputs=[input_row, activity_column, activities_content,
+                         session_state, browser_id],
+                concurrency_limit=None
             )
 
+            # Bind follow-up questions
+            for trigger in (follow_up_button.click, follow_up.submit):
+                trigger(
+                    fn=ask_follow_up,
+                    inputs=[follow_up, session_state],
+                    outputs=[follow_up, activities_content, session_state],
+                    concurrency_limit=None
+                )
+
             # Bind activity complete
             complete_button.click(
                 lambda: gr.update(visible=True),
@@ -120,7 +616,8 @@ with gr.Blocks(title="Time to Recharge") as demo:
             )
 
             # Feedback buttons route back to home
-            better_btn.click(fn=record_feedback, inputs=[], outputs=[])
+            better_btn.click(fn=lambda session: record_feedback("better", session),
+                             inputs=[session_state], outputs=[])
             better_btn.click(lambda: [
                 gr.update(visible=True),         # show input row
                 gr.update(visible=False),        # hide feedback drawer
@@ -128,7 +625,8 @@ with gr.Blocks(title="Time to Recharge") as demo:
                 gr.update(selected="tab_recharge")
             ], outputs=[input_row, feedback_drawer, activity_column, tabs])
 
-            same_btn.click(fn=record_feedback, inputs=[], outputs=[])
+            same_btn.click(fn=lambda session: record_feedback("same", session),
+                           inputs=[session_state], outputs=[])
             same_btn.click(lambda: [
                 gr.update(visible=True),
                 gr.update(visible=False),
@@ -136,12 +634,57 @@ with gr.Blocks(title="Time to Recharge") as demo:
                 gr.update(selected="tab_recharge")
             ], outputs=[input_row, feedback_drawer, activity_column, tabs])
 
-        with gr.TabItem("History"):
-            gr.Markdown("_No past sessions yet._")
+        with gr.TabItem("History") as history_tab:
+            load_history, history_outputs = create_sessions_tab(
+                session_store.history, "_No past sessions yet._", browser_id)
+        history_tab.select(load_history, inputs=browser_id, outputs=history_outputs)
+
+        with gr.TabItem("Favorites") as favorites_tab:
+            load_favorites, favorites_outputs = create_sessions_tab(
+                session_store.favorites,
+                "_Your favorite activities will appear here._", browser_id)
+        favorites_tab.select(load_favorites, inputs=browser_id,
+                             outputs=favorites_outputs)
+
+app = FastAPI()
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the model (or any worker) is ready."""
+    status = {"workers": worker_pool.stats()} if worker_pool else model_holder.status()
+    return JSONResponse(status, status_code=200 if model_ready() else 503)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms and request/token counters."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/feedback")
+def feedback_rates():
+    """"Felt better" rates per activity, scene and prompt version."""
+    return feedback_log.summary()
+
+
+@app.middleware("http")
+async def time_uploads(request: Request, call_next):
+    # Gradio receives uploaded photos and audio before start_session runs
+    if not metrics.ENABLED or not request.url.path.endswith("/upload"):
+        return await call_next(request)
+    with metrics.stage("upload"):
+        return await call_next(request)
+
 
-        with gr.TabItem("Favorites"):
-            gr.Markdown("_Your favorite activities will appear here._")
+app = gr.mount_gradio_app(app, demo, path="/")
 
 # Dev mode launcher
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", server_port=7860)
+    # The UI is served right away while the model loads in the background
+    if worker_pool is None:
+        model_holder.start()
+    print(f"UI ready {time.perf_counter() - APP_STARTED:.1f}s after import")
+    uvicorn.run(app, host="0.0.0.0", port=7860)
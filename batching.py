@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import metrics
+
+
+class BatchScheduler:
+    """
+    Collects concurrent requests for a short window and runs them through a
+    single batched call.
+
+    ``run_batch`` receives a list of requests and must return one result per
+    request, in the same order. Requests only share a batch when
+    ``batch_key`` returns the same value for them, so inputs that cannot be
+    padded together (e.g. with and without an image) are run separately.
+    """
+
+    def __init__(self, run_batch, max_batch_size=4, max_wait_ms=10,
+                 batch_key=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_key = batch_key or (lambda request: None)
+        self.batch_sizes = Counter()
+        self.queue_waits = deque(maxlen=1000)
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, request):
+        """Queue ``request`` and block until its result is ready."""
+        future = Future()
+        self._queue.put((request, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(pending) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+
+            groups = {}
+            for item in pending:
+                try:
+                    key = self.batch_key(item[0])
+                except Exception as e:
+                    # Fail this request only; the worker must keep running
+                    item[1].set_exception(e)
+                    continue
+                groups.setdefault(key, []).append(item)
+
+            for group in groups.values():
+                started = time.perf_counter()
+                waits = [started - queued for _, _, queued in group]
+                with self._stats_lock:
+                    self.batch_sizes[len(group)] += 1
+                    self.queue_waits.extend(waits)
+                metrics.BATCH_SIZE.observe(len(group))
+                for wait in waits:
+                    metrics.STAGE_SECONDS.observe(wait, stage="batch_queue_wait")
+
+                try:
+                    results = self.run_batch([request for request, _, _ in group])
+                except Exception as e:
+                    for _, future, _ in group:
+                        future.set_exception(e)
+                    continue
+
+                for (_, future, _), result in zip(group, results):
+                    future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self.queue_waits)
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(int(p * len(waits)), len(waits) - 1)] * 1000
+
+        return {
+            "batch_sizes": batch_sizes,
+            "queue_wait_ms": {
+                "count": len(waits),
+                "mean": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": waits[-1] * 1000 if waits else 0.0,
+            },
+        }
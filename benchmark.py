@@ -0,0 +1,230 @@
+"""
+Benchmark call_gemma latency over the bundled image corpus.
+
+Runs every nature category image under images/nature_meditation_images/output
+and the indoor samples in images/ with both prompt versions, plus text-only
+requests, and prints machine-readable JSON with prefill time, time to first
+token, decode tokens/sec, end-to-end p50/p95/p99, peak RSS and output token
+counts.
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --tiny --limit 2 --max-new-tokens 16   # CPU smoke run
+
+``--tiny`` swaps in a randomly-initialized model with a two-layer decoder,
+but keeps the full-size vision tower (see gemma_server.tiny_model_config),
+so image requests are not tiny. The processor and tokenizer are still
+loaded from GEMMA_PATH, which must hold at least the processor files.
+    python benchmark.py --dataset .cache/images.npy  # packed by image_dataset.py
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import resource
+import sys
+import time
+
+import torch
+from transformers.generation.streamers import BaseStreamer
+
+TEXT_ONLY_REQUESTS = [
+    "We are at the park after school and the kids are restless.",
+    "Sitting in a noisy office, I need a two minute reset.",
+    "Stuck in traffic with two kids in the back seat.",
+]
+
+
+def corpus(limit=None):
+    """``(group, image path)`` pairs for the nature categories and indoor samples."""
+    samples = []
+    for category_dir in sorted(glob.glob("images/nature_meditation_images/output/*")):
+        paths = sorted(glob.glob(os.path.join(category_dir, "*.jpg")))[:limit]
+        samples += [(os.path.basename(category_dir), path) for path in paths]
+    indoor = sorted(glob.glob("images/*.jp*g"))[:limit]
+    samples += [("indoor", path) for path in indoor]
+    return samples
+
+
+def packed_corpus(path, limit=None):
+    """
+    ``(group, image, original path)`` for a corpus packed by
+    ``image_dataset.py build``; the images are already decoded and resized.
+    """
+    from image_dataset import ImageDataset
+
+    dataset = ImageDataset(path)
+    samples = []
+    for category, (start, stop) in dataset.categories.items():
+        stop = min(stop, start + limit) if limit else stop
+        samples += [(category, dataset.image(row), dataset.images[row]["path"])
+                    for row in range(start, stop)]
+    return samples
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+class TimingStreamer(BaseStreamer):
+    """
+    Records when generated tokens come out of model.generate, and how many
+    each time: assisted decoding can accept several tokens in one step.
+    """
+
+    def __init__(self):
+        self.token_times = []
+        self.token_counts = []
+        self.prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the prompt, every later one new tokens
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        self.token_times.append(time.perf_counter())
+        self.token_counts.append(value.numel())
+
+    def end(self):
+        pass
+
+
+def run_one(gemma_server, message, image_path, prompt, max_new_tokens):
+    start = time.perf_counter()
+    inputs = gemma_server.tokenize_request(message, image_path, prompt)
+    tokenized = time.perf_counter()
+    past_key_values = gemma_server.prefix_cache.prefill(inputs, prompt)
+
+    streamer = TimingStreamer()
+    with torch.inference_mode():
+        gemma_server.model.generate(
+            **inputs,
+            past_key_values=past_key_values,
+            streamer=streamer,
+            **gemma_server.generation_params(max_new_tokens),
+            **gemma_server.speculative.generate_kwargs()
+        )
+    end = time.perf_counter()
+
+    times = streamer.token_times
+    output_tokens = sum(streamer.token_counts)
+    # Tokens decoded after the first step, over the time since it
+    decode_tokens = output_tokens - (streamer.token_counts[0] if times else 0)
+    first_token = times[0] if times else end
+    decode_seconds = end - first_token
+    return {
+        "input_tokens": inputs["input_ids"].shape[-1],
+        "output_tokens": output_tokens,
+        "preprocess_seconds": tokenized - start,
+        "prefill_seconds": first_token - tokenized,
+        "ttft_seconds": first_token - start,
+        "decode_tokens_per_second": (decode_tokens / decode_seconds
+                                     if decode_tokens and decode_seconds else None),
+        "e2e_seconds": end - start,
+    }
+
+
+def summarize(runs):
+    def mean(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    e2e = [run["e2e_seconds"] for run in runs]
+    return {
+        "runs": len(runs),
+        "e2e_p50_seconds": percentile(e2e, 50),
+        "e2e_p95_seconds": percentile(e2e, 95),
+        "e2e_p99_seconds": percentile(e2e, 99),
+        "mean_prefill_seconds": mean("prefill_seconds"),
+        "mean_ttft_seconds": mean("ttft_seconds"),
+        "mean_decode_tokens_per_second": mean("decode_tokens_per_second"),
+        "mean_input_tokens": mean("input_tokens"),
+        "mean_output_tokens": mean("output_tokens"),
+        "total_output_tokens": sum(run["output_tokens"] for run in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tiny", action="store_true",
+                        help="Use a tiny randomly-initialized decoder (CPU friendly); "
+                             "the vision tower stays full size and the processor "
+                             "still comes from GEMMA_PATH")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Images per category / indoor samples to run")
+    parser.add_argument("--prompts", default="v1,v2",
+                        help="Prompt versions to run over the images")
+    parser.add_argument("--no-text-only", action="store_true",
+                        help="Skip the text-only requests")
+    parser.add_argument("--dataset",
+                        help="Read images from a pack built by image_dataset.py "
+                             "instead of decoding the JPEGs")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.tiny:
+        os.environ["ZEN_MODEL"] = "tiny"
+
+    # Keep stdout for the JSON report; gemma_server logs every request
+    with contextlib.redirect_stdout(sys.stderr):
+        import gemma_server
+
+        started = time.perf_counter()
+        gemma_server.model_holder.wait()
+        load_seconds = time.perf_counter() - started
+
+    prompts = {"v1": gemma_server.ZEN_IMG_PROMPT, "v2": gemma_server.ZEN_IMG_PROMPT_v2}
+    if args.dataset:
+        samples = packed_corpus(args.dataset, args.limit)
+    else:
+        samples = [(group, path, path) for group, path in corpus(args.limit)]
+    workloads = []
+    for version in args.prompts.split(","):
+        for group, image, path in samples:
+            workloads.append((f"{version}/{group}", "", image, path, prompts[version]))
+    if not args.no_text_only:
+        workloads += [("text_only", text, None, None, None) for text in TEXT_ONLY_REQUESTS]
+
+    results = []
+    with contextlib.redirect_stdout(sys.stderr):
+        for workload, message, image, path, prompt in workloads:
+            run = run_one(gemma_server, message, image, prompt,
+                          args.max_new_tokens)
+            run.update({"workload": workload, "image": path})
+            results.append(run)
+
+    groups = {}
+    for run in results:
+        groups.setdefault(run["workload"].split("/")[0], []).append(run)
+
+    report = {
+        "config": {
+            "model": gemma_server.MODEL_VARIANT,
+            "inference_mode": gemma_server.INFERENCE_MODE,
+            "decoding": gemma_server.DECODING_MODE,
+            "prefix_cache": gemma_server.PREFIX_CACHE_ENABLED,
+            "max_new_tokens": args.max_new_tokens,
+            "dataset": args.dataset,
+        },
+        "load_seconds": load_seconds,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "summary": {name: summarize(runs) for name, runs in groups.items()},
+        "overall": summarize(results),
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
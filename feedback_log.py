@@ -0,0 +1,181 @@
+"""
+Append-only log of session feedback with running "felt better" rates.
+
+    python feedback_log.py export feedback.npz   # columnar export for analysis
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from session_store import SessionStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback_events (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    session_id TEXT,
+    better INTEGER NOT NULL,
+    scene TEXT,
+    prompt_version TEXT,
+    activities TEXT
+);
+CREATE TABLE IF NOT EXISTS feedback_aggregates (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    better INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+) WITHOUT ROWID;
+"""
+
+INSERT_EVENT = """
+INSERT INTO feedback_events (
+    created_at, session_id, better, scene, prompt_version, activities
+) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_AGGREGATE = """
+INSERT INTO feedback_aggregates (dimension, key, better, total) VALUES (?, ?, ?, 1)
+ON CONFLICT (dimension, key) DO UPDATE SET
+    better = better + excluded.better, total = total + 1
+"""
+
+DIMENSIONS = ("activity", "scene", "prompt_version")
+
+# Activity names are joined with this in the event log
+SEPARATOR = "|"
+
+
+class FeedbackLog:
+    """
+    Feedback events appended to a ``SessionStore``'s database, with running
+    per-activity, per-scene and per-prompt-version "felt better" counts.
+
+    Each event and its aggregate updates go through the store's
+    write-behind queue in one transaction. The counts are mirrored in
+    memory, so looking up a rate never touches the events.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        store.create(SCHEMA)
+        # (dimension, key) -> [better, total]
+        self._aggregates = {
+            (dimension, key): [better, total]
+            for dimension, key, better, total in store.read(
+                "SELECT dimension, key, better, total FROM feedback_aggregates")
+        }
+        self._lock = threading.Lock()
+
+    def record(self, session_id, feedback, activities=(), scene=None,
+               prompt_version=None):
+        """Append a feedback event; ``activities`` are the suggested names."""
+        better = int(feedback == "better")
+        keys = [("activity", name) for name in activities]
+        if scene:
+            keys.append(("scene", scene))
+        if prompt_version:
+            keys.append(("prompt_version", prompt_version))
+
+        self.store.write(
+            (INSERT_EVENT, (time.time(), session_id, better, scene,
+                            prompt_version, SEPARATOR.join(activities))),
+            *[(UPDATE_AGGREGATE, (dimension, key, better)) for dimension, key in keys]
+        )
+        with self._lock:
+            for key in keys:
+                counts = self._aggregates.setdefault(key, [0, 0])
+                counts[0] += better
+                counts[1] += 1
+
+    def rate(self, dimension, key):
+        """``{"better", "total", "rate"}`` for one activity, scene or prompt version."""
+        with self._lock:
+            better, total = self._aggregates.get((dimension, key), (0, 0))
+        return {"better": better, "total": total,
+                "rate": better / total if total else None}
+
+    def rates(self, dimension):
+        """Rates for every key of ``dimension`` seen so far."""
+        with self._lock:
+            keys = [key for dim, key in self._aggregates if dim == dimension]
+        return {key: self.rate(dimension, key) for key in keys}
+
+    def summary(self):
+        return {dimension: self.rates(dimension) for dimension in DIMENSIONS}
+
+
+def encode(values):
+    """Dictionary-encode strings into ``(codes, categories)``; -1 for ``None``."""
+    categories = sorted({value for value in values if value is not None})
+    index = {value: i for i, value in enumerate(categories)}
+    codes = np.array([index.get(value, -1) for value in values], dtype=np.int32)
+    return codes, np.array(categories, dtype=str)
+
+
+def export(store, path, chunk_size=100_000):
+    """
+    Write every feedback event to a compressed ``.npz`` file with one array
+    per column. Strings are dictionary-encoded, and each event's activities
+    become rows of the ``activity_event`` / ``activity`` columns.
+    """
+    created_at, better, scenes, versions = [], [], [], []
+    activity_event, activity_names = [], []
+    last_id = 0
+    while True:
+        rows = store.read(
+            "SELECT id, created_at, better, scene, prompt_version, activities "
+            "FROM feedback_events WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size),
+        )
+        for row in rows:
+            event = len(created_at)
+            created_at.append(row["created_at"])
+            better.append(row["better"])
+            scenes.append(row["scene"])
+            versions.append(row["prompt_version"])
+            for name in filter(None, (row["activities"] or "").split(SEPARATOR)):
+                activity_event.append(event)
+                activity_names.append(name)
+        if len(rows) < chunk_size:
+            break
+        last_id = rows[-1]["id"]
+
+    scene_codes, scene_values = encode(scenes)
+    version_codes, version_values = encode(versions)
+    activity_codes, activity_values = encode(activity_names)
+    np.savez_compressed(
+        path,
+        created_at=np.array(created_at, dtype=np.float64),
+        better=np.array(better, dtype=np.int8),
+        scene=scene_codes,
+        scene_values=scene_values,
+        prompt_version=version_codes,
+        prompt_version_values=version_values,
+        activity_event=np.array(activity_event, dtype=np.int32),
+        activity=activity_codes,
+        activity_values=activity_values,
+    )
+    return len(created_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["export", "summary"])
+    parser.add_argument("output", nargs="?", default="feedback.npz")
+    parser.add_argument("--db", default=".cache/sessions.db")
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    if args.command == "export":
+        print(f"Exported {export(store, args.output)} events to {args.output}")
+    else:
+        print(json.dumps(FeedbackLog(store).summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,109 @@
 GEMMA_PATH = "models/gemma-3n-transformers-gemma-3n-e2b-it-v2"
 
-from transformers import AutoProcessor, Gemma3nForConditionalGeneration
+import time
+
+# Before torch and transformers, so import-to-ready includes their import
+# time, like APP_STARTED in app.py
+IMPORT_STARTED = time.perf_counter()
+
+import base64
+import io
+import os
+import threading
+from transformers import (
+    AutoProcessor,
+    Gemma3nAudioConfig,
+    Gemma3nConfig,
+    Gemma3nForConditionalGeneration,
+    Gemma3nTextConfig,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
 from PIL import Image
+from pprint import pprint
 import requests
 import torch
-import pprint
 
+import metrics
+from activity_catalog import build_selection_prompt, parse_catalog
+from audio_preprocessing import AudioPreprocessor
+from batching import BatchScheduler
+from image_preprocessing import ImagePreprocessor
+from model_holder import ModelHolder
+from prefix_cache import PrefixCache
+from scene_retrieval import SCENE_ACTIVITIES, ActivityRetriever
+from session_cache import SessionCache
+from speculative import SpeculativeDecoding
+from vision_cache import VisionEmbeddingCache
+
+# Set ZEN_PREFIX_CACHE=0 to prefill the whole prompt on every request
+PREFIX_CACHE_ENABLED = os.environ.get("ZEN_PREFIX_CACHE", "1") != "0"
+
+# Concurrent requests arriving within BATCH_MAX_WAIT_MS share one generate
+# call; set ZEN_BATCH_MAX_SIZE=1 to run every request on its own
+BATCH_MAX_SIZE = int(os.environ.get("ZEN_BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("ZEN_BATCH_MAX_WAIT_MS", "10"))
+
+# Set ZEN_MODEL=tiny to run a tiny randomly-initialized model (for
+# benchmarks and smoke tests on CPU-only boxes). The processor and tokenizer
+# are still loaded from GEMMA_PATH.
+MODEL_VARIANT = os.environ.get("ZEN_MODEL", "gemma")
+
+# bf16 (default), int8 or int4. The quantized modes load the model on CPU
+# with torchao weight-only quantization of the linear layers.
+INFERENCE_MODE = os.environ.get("ZEN_INFERENCE_MODE", "bf16")
+
+# standard, prompt_lookup (propose tokens copied from the prompt) or draft
+# (propose tokens with the small model at ZEN_DRAFT_MODEL)
+DECODING_MODE = os.environ.get("ZEN_DECODING", "standard")
+PROMPT_LOOKUP_TOKENS = int(os.environ.get("ZEN_PROMPT_LOOKUP_TOKENS", "10"))
+DRAFT_MODEL_PATH = os.environ.get("ZEN_DRAFT_MODEL")
+
+# Uploaded audio is trimmed to speech and capped at this many seconds
+AUDIO_MAX_SECONDS = float(os.environ.get("ZEN_AUDIO_MAX_SECONDS", "30"))
+
+# Follow-up turns reuse the session's KV cache. ZEN_SESSION_CACHE_MB caps
+# the memory held by idle sessions (0 disables the cache); sessions are
+# dropped after ZEN_SESSION_IDLE_MINUTES without a follow-up.
+SESSION_CACHE_MB = int(os.environ.get("ZEN_SESSION_CACHE_MB", "512"))
+SESSION_CACHE_MAX = int(os.environ.get("ZEN_SESSION_CACHE_MAX", "64"))
+SESSION_IDLE_MINUTES = float(os.environ.get("ZEN_SESSION_IDLE_MINUTES", "15"))
+
+# freeform: the model writes out the activities. structured: the model only
+# picks activity numbers and an intro line, and the app renders the cards
+# from the catalog (falling back to freeform if the reply can't be parsed)
+RESPONSE_MODE = os.environ.get("ZEN_RESPONSE_MODE", "freeform")
+
+# Only the ZEN_ACTIVITY_TOP_K activities most relevant to the photo's scene
+# are sent to the model; 0 sends the whole catalog
+ACTIVITY_TOP_K = int(os.environ.get("ZEN_ACTIVITY_TOP_K", "6"))
+
+# Memory cap for cached vision tower embeddings; 0 disables the cache
+VISION_CACHE_MB = int(os.environ.get("ZEN_VISION_CACHE_MB", "256"))
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+# Closes every turn in Gemma's chat template
+END_OF_TURN = "<end_of_turn>"
 
-model = Gemma3nForConditionalGeneration.from_pretrained(
-    GEMMA_PATH, 
-    device_map="auto", 
-    torch_dtype=torch.bfloat16
-).eval()
+# Decoding settings shared by every generate call
+GENERATION_PARAMS = {"max_new_tokens": 1024, "do_sample": False}
 
-processor = AutoProcessor.from_pretrained(GEMMA_PATH)
+# Loaded in the background by model_holder, see load_model()
+model = None
+processor = None
+prefix_cache = None
+vision_cache = None
+speculative = None
+
+# Uploads are decoded and resized once here instead of inside the processor
+image_preprocessor = ImagePreprocessor()
+audio_preprocessor = AudioPreprocessor(max_seconds=AUDIO_MAX_SECONDS)
+session_cache = SessionCache(
+    max_sessions=SESSION_CACHE_MAX,
+    max_bytes=SESSION_CACHE_MB * 1024 * 1024,
+    idle_seconds=SESSION_IDLE_MINUTES * 60,
+) if SESSION_CACHE_MB > 0 else None
 
 ZEN_IMG_PROMPT = (
     "Guide the user into a mindfulness meditation session by choosing two of 3 activities. "
@@ -119,39 +209,573 @@ Ensure that all the activities have these characteristics
 **Invite reflection:** Ask "What did you notice?" or "How did that feel?"
 """
 
-def call_gemma(message, image_path=None, conversation_history=[]):
+# Activities parsed out of ZEN_IMG_PROMPT_v2, so the app can render them
+# itself when the model only picks activity numbers
+ACTIVITY_CATALOG = parse_catalog(ZEN_IMG_PROMPT_v2)
+ZEN_IMG_PROMPT_STRUCTURED = build_selection_prompt(ACTIVITY_CATALOG)
+# Requests with audio but no photo choose from the same activities
+ZEN_AUDIO_PROMPT = ZEN_IMG_PROMPT_v2.replace(
+    "based on the image provided",
+    "based on what the user says or what you hear in the audio provided",
+)
+# Room for "ACTIVITIES: ..." plus one intro sentence
+STRUCTURED_MAX_NEW_TOKENS = 64
+
+def build_messages(message, image_path=None, prompt=None, audio_path=None,
+                   conversation_history=()):
+    """
+    Build the chat messages for a request. The fixed ``prompt`` goes first in
+    the user turn so that every request shares the same token prefix.
+
+    ``conversation_history`` holds the earlier turns of a session as
+    ``{"role": "user" | "assistant", "content": str}`` dicts. The prompt,
+    image and audio belong to its first user turn, and ``message`` becomes
+    the new user turn at the end.
+    """
+    history = list(conversation_history)
+    if history:
+        message, follow_up = history.pop(0)["content"], message
+
+    content = []
+    if prompt:
+        content.append({"type": "text", "text": prompt})
+    if image_path:
+        with metrics.stage("image_preprocess"):
+            image = image_preprocessor(image_path)
+        content.append({"type": "image", "image": image})
+    if audio_path:
+        with metrics.stage("audio_preprocess"):
+            audio = audio_preprocessor(audio_path)
+        if len(audio):
+            content.append({"type": "audio", "audio": audio})
+    if message:
+        content.append({"type": "text", "text": message})
 
     messages = [
         {
             "role": "system",
-            "content": [{"type": "text", "text": "You are a helpful assistant."}]
+            "content": [{"type": "text", "text": SYSTEM_PROMPT}]
         },
         {
             "role": "user",
-            "content": [
-                {"type": "image", "image": image_path},
-                {"type": "text", "text": message}
-            ]
+            "content": content
         }
     ]
+    if conversation_history:
+        for turn in history + [{"role": "user", "content": follow_up}]:
+            messages.append({
+                "role": turn["role"],
+                "content": [{"type": "text", "text": turn["content"]}]
+            })
+    return messages
+
+
+def get_quantization_config(mode):
+    if mode == "bf16":
+        return None
+
+    from transformers import TorchAoConfig
+    if mode == "int8":
+        return TorchAoConfig("int8_weight_only")
+    if mode == "int4":
+        from torchao.dtypes import Int4CPULayout
+        return TorchAoConfig(
+            "int4_weight_only", group_size=128, layout=Int4CPULayout()
+        )
+
+    raise ValueError(f"Unknown inference mode: {mode}")
+
+
+def tiny_model_config():
+    """
+    Gemma 3n config with a two-layer text decoder and a small audio tower.
+
+    The vision tower keeps its default config: the MobileNetV5-300M encoder
+    (about 300M randomly initialized parameters, run at 768x768) is a timm
+    architecture with no smaller variant that still yields the soft tokens
+    the decoder expects. Image requests on the tiny model therefore still
+    cost a full vision forward pass, and its timings are only meaningful for
+    the decoder and the request path around the model.
+    """
+    text_config = Gemma3nTextConfig(
+        hidden_size=64,
+        hidden_size_per_layer_input=16,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        num_key_value_heads=1,
+        head_dim=32,
+        layer_types=["sliding_attention", "full_attention"],
+        sliding_window=64,
+        activation_sparsity_pattern=[0.0, 0.0],
+        num_kv_shared_layers=0,
+        laurel_rank=8,
+    )
+    audio_config = Gemma3nAudioConfig(
+        hidden_size=64, conf_num_attention_heads=2, conf_num_hidden_layers=1
+    )
+    return Gemma3nConfig(
+        text_config=text_config.to_dict(), audio_config=audio_config.to_dict()
+    )
+
+
+def load_model():
+    global model, processor, prefix_cache, vision_cache, speculative
+
+    if MODEL_VARIANT == "tiny":
+        print("Loading a tiny randomly-initialized Gemma")
+        torch.manual_seed(0)
+        model = Gemma3nForConditionalGeneration(tiny_model_config()).to(
+            torch.bfloat16
+        ).eval()
+    else:
+        quantization_config = get_quantization_config(INFERENCE_MODE)
+        print(f"Loading Gemma in {INFERENCE_MODE} mode")
+
+        model = Gemma3nForConditionalGeneration.from_pretrained(
+            GEMMA_PATH, 
+            device_map="cpu" if quantization_config else "auto", 
+            torch_dtype=torch.bfloat16,
+            quantization_config=quantization_config
+        ).eval()
+
+    if VISION_CACHE_MB > 0:
+        revision = f"{GEMMA_PATH}@{getattr(model.config, '_commit_hash', None)}"
+        vision_cache = VisionEmbeddingCache(
+            revision, max_bytes=VISION_CACHE_MB * 1024 * 1024
+        )
+        vision_cache.install(model)
+
+    processor = AutoProcessor.from_pretrained(GEMMA_PATH)
+    # Batched prompts are left-padded so generated tokens line up at the end
+    processor.tokenizer.padding_side = "left"
+
+    speculative = SpeculativeDecoding(
+        DECODING_MODE, PROMPT_LOOKUP_TOKENS, DRAFT_MODEL_PATH
+    )
+    speculative.install(model, processor.tokenizer)
+    audio_preprocessor.install(model)
+
+    size = processor.image_processor.size
+    image_preprocessor.size = (size.get("width", 768), size.get("height", 768))
+    audio_preprocessor.sampling_rate = processor.feature_extractor.sampling_rate
+
+    prefix_cache = PrefixCache(
+        model, processor, build_messages, enabled=PREFIX_CACHE_ENABLED
+    )
+    if PREFIX_CACHE_ENABLED:
+        for prompt in default_prompts():
+            prefix_cache.warm(prompt)
+
+
+def default_prompts():
+    """
+    The activity prompts requests use by default: one per scene for photos,
+    and the full one for audio without a photo.
+    """
+    structured = RESPONSE_MODE == "structured"
+    if ACTIVITY_TOP_K <= 0:
+        return [ZEN_IMG_PROMPT_STRUCTURED if structured else ZEN_IMG_PROMPT_v2,
+                ZEN_AUDIO_PROMPT]
+    retriever = ActivityRetriever(ACTIVITY_CATALOG, top_k=ACTIVITY_TOP_K)
+    # None is the whole catalog, for photos without a clear scene
+    return [retriever.prompt_for(ZEN_IMG_PROMPT_v2, scene, structured)
+            for scene in (*SCENE_ACTIVITIES, None)] + [ZEN_AUDIO_PROMPT]
+
+
+def warmup_model():
+    # A short generation over a blank image exercises the vision tower and
+    # the decoder so the first real request runs at full speed
+    generate(
+        "Describe this image.",
+        image_path=Image.new("RGB", (768, 768), "white"),
+        max_new_tokens=8
+    )
+
+
+model_holder = ModelHolder(load_model, warmup_model, started_at=IMPORT_STARTED)
+
+
+def tokenize_request(message, image_path=None, prompt=None, audio_path=None,
+                     conversation_history=()):
+    """Model inputs for a single request, on the model's device."""
+    messages = build_messages(message, image_path=image_path, prompt=prompt,
+                              audio_path=audio_path,
+                              conversation_history=conversation_history)
     
     print("Calling Gemma with the following messages:")
     pprint(messages)
 
-    inputs = processor.apply_chat_template(
-        messages,
+    with metrics.stage("apply_chat_template"):
+        inputs = processor.apply_chat_template(
+            messages,
+            add_generation_prompt=True,
+            tokenize=True,
+            return_dict=True,
+            return_tensors="pt",
+        )
+    with metrics.stage("to_device"):
+        inputs = inputs.to(model.device, dtype=torch.bfloat16)
+    metrics.INPUT_TOKENS.inc(inputs["input_ids"].numel())
+    return inputs
+
+
+def follow_up_ids(message):
+    """
+    Token ids that close the previous model turn and add ``message`` as a
+    new user turn, ready for the model to answer.
+    """
+    turns = [
+        {"role": "user", "content": [{"type": "text", "text": "a"}]},
+        {"role": "assistant", "content": [{"type": "text", "text": "b"}]},
+    ]
+    before = processor.apply_chat_template(turns, tokenize=False)
+    after = processor.apply_chat_template(
+        turns + [{"role": "user", "content": [{"type": "text", "text": message}]}],
+        tokenize=False,
         add_generation_prompt=True,
-        tokenize=True,
-        return_dict=True,
-        return_tensors="pt",
-    ).to(model.device, dtype=torch.bfloat16)
+    )
+    # Everything after the end-of-turn marker that closes the model's reply
+    end_of_turn = before.rindex(END_OF_TURN) + len(END_OF_TURN)
+    return processor.tokenizer(
+        after[end_of_turn:], add_special_tokens=False, return_tensors="pt"
+    )["input_ids"][0]
+
+
+def session_inputs(message, conversation_history, session_id, prompt=None):
+    """
+    Model inputs continuing the cached KV state of ``session_id``, so only
+    the new user turn gets prefilled. Returns ``(None, None)`` on a miss,
+    including when the cached turns were built with another ``prompt``.
+    """
+    entry = session_cache.take(session_id, conversation_history, prompt)
+    if entry is None:
+        return None, None
+
+    ids = entry.ids
+    end_of_turn_id = processor.tokenizer.convert_tokens_to_ids(END_OF_TURN)
+    if ids[-1] != end_of_turn_id:
+        # The reply was cut off at max_new_tokens; close the turn ourselves
+        ids = torch.cat([ids, ids.new_tensor([end_of_turn_id])])
+    input_ids = torch.cat([ids, follow_up_ids(message).to(ids.device)])
+    input_ids = input_ids.unsqueeze(0).to(model.device)
+    metrics.INPUT_TOKENS.inc(input_ids.shape[-1] - len(entry.ids) + 1)
+    return ({"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+            entry.past_key_values)
+
+
+def remember_session(session_id, conversation_history, message, reply,
+                     sequence, past_key_values, prompt=None):
+    """Keep the KV state of a finished turn for the session's next one."""
+    if session_cache is None or session_id is None or past_key_values is None:
+        return
+    history = list(conversation_history) + [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply},
+    ]
+    session_cache.put(session_id, history, sequence.detach(), past_key_values,
+                      prompt)
+
+
+def prepare_inputs(message, image_path=None, prompt=None, audio_path=None,
+                   conversation_history=(), session_id=None):
+    """
+    Tokenize a request and prefill what the prefix cache allows. Returns the
+    model inputs and the KV cache to continue from (``None`` on a miss).
+
+    Follow-up turns of a session continue from the session's cached KV
+    state instead, when it is still around.
+    """
+    if session_cache is not None and session_id is not None and conversation_history:
+        start = time.perf_counter()
+        inputs, past_key_values = session_inputs(
+            message, conversation_history, session_id, prompt)
+        if inputs is not None:
+            print(f"Session cache hit, took {time.perf_counter() - start:.2f}s "
+                  f"({session_cache.stats()})")
+            return inputs, past_key_values
 
+    inputs = tokenize_request(message, image_path, prompt, audio_path,
+                              conversation_history)
+
+    start = time.perf_counter()
+    with metrics.stage("prefix_prefill"):
+        past_key_values = prefix_cache.prefill(inputs, prompt)
+    print(f"Prefill took {time.perf_counter() - start:.2f}s "
+          f"(prefix cache: {prefix_cache.stats()}, "
+          f"images: {image_preprocessor.stats()})")
+    if audio_path:
+        print(f"Audio: {audio_preprocessor.stats()}")
+    if past_key_values is not None:
+        # The prefill above encoded the image, so generate won't
+        log_vision_cache(image_path)
+
+    return inputs, past_key_values
+
+
+def log_vision_cache(image_path):
+    """
+    Log the vision cache counts once this request's image has been looked
+    up: in the prefix cache prefill, or in ``generate`` when that missed.
+    """
+    if image_path and vision_cache is not None:
+        print(f"Vision cache: {vision_cache.stats()}")
+
+
+def count_tokens(text):
+    """Number of tokens ``text`` takes up in a prompt."""
+    model_holder.wait()
+    return len(processor.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def generation_params(max_new_tokens=None):
+    """GENERATION_PARAMS with an optional per-request token limit."""
+    params = dict(GENERATION_PARAMS)
+    if max_new_tokens:
+        params["max_new_tokens"] = max_new_tokens
+    return params
+
+
+def generate(message, image_path=None, prompt=None, max_new_tokens=None,
+             audio_path=None, conversation_history=(), session_id=None):
+    """Run a single request through the model."""
+    inputs, past_key_values = prepare_inputs(
+        message, image_path, prompt, audio_path, conversation_history, session_id)
     input_len = inputs["input_ids"].shape[-1]
 
-    with torch.inference_mode():
-        generation = model.generate(**inputs, max_new_tokens=1024, do_sample=False)
-        generation = generation[0][input_len:]
+    with torch.inference_mode(), metrics.stage("generate"):
+        outputs = model.generate(
+            **inputs,
+            past_key_values=past_key_values,
+            return_dict_in_generate=True,
+            **generation_params(max_new_tokens),
+            **speculative.generate_kwargs()
+        )
+        generation = outputs.sequences[0][input_len:]
+    metrics.OUTPUT_TOKENS.inc(generation.numel())
+    if past_key_values is None:
+        log_vision_cache(image_path)
 
-    decoded = processor.decode(generation, skip_special_tokens=True)
-    
-    return decoded
\ No newline at end of file
+    with metrics.stage("decode"):
+        decoded = processor.decode(generation, skip_special_tokens=True)
+    if speculative.mode != "standard":
+        print(f"Speculative decoding: {speculative.stats()}")
+
+    remember_session(session_id, conversation_history, message, decoded,
+                     outputs.sequences[0], outputs.past_key_values, prompt)
+    return decoded
+
+
+def generate_batch(requests):
+    """
+    Run several requests through one padded ``model.generate`` call and
+    return the decoded outputs in request order.
+    """
+    if len(requests) == 1:
+        return [generate(**requests[0])]
+
+    conversations = [
+        build_messages(request["message"], request["image_path"], request["prompt"],
+                       request["audio_path"])
+        for request in requests
+    ]
+    print(f"Calling Gemma with a batch of {len(conversations)} requests")
+
+    with metrics.stage("apply_chat_template"):
+        inputs = processor.apply_chat_template(
+            conversations,
+            add_generation_prompt=True,
+            tokenize=True,
+            return_dict=True,
+            return_tensors="pt",
+            padding=True,
+        )
+    with metrics.stage("to_device"):
+        inputs = inputs.to(model.device, dtype=torch.bfloat16)
+
+    input_len = inputs["input_ids"].shape[-1]
+    metrics.INPUT_TOKENS.inc(int(inputs["attention_mask"].sum()))
+
+    with torch.inference_mode(), metrics.stage("generate"):
+        generation = model.generate(
+            **inputs, **generation_params(requests[0]["max_new_tokens"])
+        )
+        generation = generation[:, input_len:]
+    metrics.OUTPUT_TOKENS.inc(int((generation != processor.tokenizer.pad_token_id).sum()))
+
+    with metrics.stage("decode"):
+        return processor.batch_decode(generation, skip_special_tokens=True)
+
+
+scheduler = BatchScheduler(
+    generate_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    batch_key=lambda request: (
+        bool(request["image_path"]), bool(request["audio_path"]),
+        request["prompt"], request["max_new_tokens"]
+    ),
+)
+
+
+def call_gemma(message, image_path=None, conversation_history=[], prompt=None,
+               max_new_tokens=None, audio_path=None, session_id=None):
+    metrics.REQUESTS.inc(api="call_gemma")
+    try:
+        model_holder.wait()
+        if session_id is not None or conversation_history:
+            # Session turns keep their own KV cache, so they run unbatched
+            return generate(message, image_path, prompt, max_new_tokens,
+                            audio_path, conversation_history, session_id)
+        return scheduler.submit({
+            "message": message,
+            "image_path": image_path,
+            "prompt": prompt,
+            "max_new_tokens": max_new_tokens,
+            "audio_path": audio_path,
+        })
+    except Exception:
+        metrics.ERRORS.inc(api="call_gemma")
+        raise
+
+
+class CountingStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that also counts the generated tokens."""
+
+    def put(self, value):
+        if not self.next_tokens_are_prompt:
+            metrics.OUTPUT_TOKENS.inc(value.numel())
+        super().put(value)
+
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generation once ``event`` is set, e.g. when the client left."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(),
+                          dtype=torch.bool, device=input_ids.device)
+
+
+def stream_gemma(message, image_path=None, conversation_history=[], prompt=None,
+                 max_new_tokens=None, audio_path=None, session_id=None):
+    """
+    Streaming variant of ``call_gemma``: yields pieces of the response text
+    as tokens are generated. Streaming requests are not batched.
+    """
+    metrics.REQUESTS.inc(api="stream_gemma")
+    try:
+        model_holder.wait()
+        inputs, past_key_values = prepare_inputs(
+            message, image_path, prompt, audio_path, conversation_history, session_id)
+    except Exception:
+        metrics.ERRORS.inc(api="stream_gemma")
+        raise
+
+    streamer = CountingStreamer(
+        processor.tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    stop = threading.Event()
+    errors = []
+    results = []
+
+    def run():
+        try:
+            # Includes incremental decoding, which the streamer does inline
+            with torch.inference_mode(), metrics.stage("generate"):
+                results.append(model.generate(
+                    **inputs,
+                    past_key_values=past_key_values,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([StopOnEvent(stop)]),
+                    return_dict_in_generate=True,
+                    **generation_params(max_new_tokens),
+                    **speculative.generate_kwargs()
+                ))
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    reply = ""
+    try:
+        for text in streamer:
+            if text:
+                reply += text
+                yield text
+    finally:
+        # Also runs when the caller closes this generator because the
+        # client went away: stop decoding before its slot is handed on
+        stop.set()
+        thread.join()
+    if errors:
+        metrics.ERRORS.inc(api="stream_gemma")
+        raise errors[0]
+    if past_key_values is None:
+        log_vision_cache(image_path)
+    remember_session(session_id, conversation_history, message, reply,
+                     results[0].sequences[0], results[0].past_key_values,
+                     prompt)
+
+
+def worker_request(body):
+    """Turn a ``WorkerPool`` request body back into ``call_gemma`` kwargs."""
+    request = {
+        key: body.get(key)
+        for key in ("message", "prompt", "max_new_tokens", "session_id")
+    }
+    request["conversation_history"] = body.get("conversation_history") or []
+    if body.get("image"):
+        request["image_path"] = io.BytesIO(base64.b64decode(body["image"]))
+    if body.get("audio"):
+        request["audio_path"] = io.BytesIO(base64.b64decode(body["audio"]))
+    return request
+
+
+def create_worker_app():
+    """
+    HTTP front for this process's model, so several worker processes (one per
+    GPU or per CPU socket) can sit behind one Gradio app. See worker_pool.py.
+    """
+    from fastapi import Body, FastAPI
+    from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+    worker = FastAPI()
+
+    @worker.get("/health")
+    def health():
+        return JSONResponse(model_holder.status(), status_code=200 if model_holder.ready else 503)
+
+    @worker.get("/metrics")
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(),
+                                 media_type="text/plain; version=0.0.4")
+
+    @worker.post("/generate")
+    def generate_endpoint(body: dict = Body(...)):
+        return {"text": call_gemma(**worker_request(body))}
+
+    @worker.post("/stream")
+    def stream_endpoint(body: dict = Body(...)):
+        return StreamingResponse(stream_gemma(**worker_request(body)),
+                                 media_type="text/plain; charset=utf-8")
+
+    return worker
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a Gemma inference worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    model_holder.start()
+    uvicorn.run(create_worker_app(), host=args.host, port=args.port)
@@ -0,0 +1,73 @@
+"""
+Benchmark the single-pass HTML scanner against the multi-pattern one.
+
+Extracts every image record from goog-img-test.html (optionally repeated
+to make a bigger page) with the previous ``_get_next_item`` driven the way
+``_get_all_items`` drives it, with the new ``_get_next_item`` driven the
+same way, and with ``html_scanner.scan_items`` in one pass, and prints
+JSON with the records found and the time each took.
+
+    python benchmark_html_scanner.py --copies 10
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import html_scanner
+from custom_google_images_download import CustomGoogleImagesDownload
+
+
+def sliced(next_item, page):
+    """Records found by slicing the page after each item, like ``_get_all_items``."""
+    urls = []
+    while True:
+        item, end = next_item(page)
+        if item == "no_links" or end <= 0:
+            return urls
+        urls.append(item['ou'])
+        page = page[end:]
+
+
+def single_pass(page):
+    return [item['ou'] for item, _ in html_scanner.scan_items(page)]
+
+
+def timed(scan, page, repeat):
+    # The multi-pattern scanner prints every URL it looks at
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            urls = scan(page)
+        seconds = (time.perf_counter() - started) / repeat
+    return {"records": len(urls), "unique": len(set(urls)), "ms": seconds * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page", default="goog-img-test.html")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="Repeat the page this many times")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.page, encoding="utf-8") as f:
+        page = f.read() * args.copies
+    downloader = CustomGoogleImagesDownload()
+
+    report = {
+        "page_kb": len(page) / 1024,
+        "regex": timed(lambda p: sliced(downloader._get_next_item_regex, p),
+                       page, args.repeat),
+        "scanner_sliced": timed(lambda p: sliced(downloader._get_next_item, p),
+                                page, args.repeat),
+        "scanner": timed(single_pass, page, args.repeat),
+    }
+    report["speedup"] = report["regex"]["ms"] / report["scanner"]["ms"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
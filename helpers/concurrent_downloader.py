@@ -0,0 +1,314 @@
+import hashlib
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dedup_index import image_hashes
+from download_manifest import DONE, DUPLICATE, FAILED
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/126.0 Safari/537.36")
+
+# Worth another try: rate limiting and server-side hiccups
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    pass
+
+
+class DuplicateImage(Exception):
+    pass
+
+
+class Progress:
+    """Thread-safe download counters with a throttled progress line."""
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.images = 0
+        self.failures = 0
+        self.duplicates = 0
+        self.retries = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def saved(self, nbytes):
+        with self._lock:
+            self.images += 1
+            self.bytes += nbytes
+        self.maybe_report()
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+        self.maybe_report()
+
+    def duplicate(self):
+        with self._lock:
+            self.duplicates += 1
+        self.maybe_report()
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        with self._lock:
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        print(f"⏬ {self.report()}")
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                "images": self.images,
+                "failures": self.failures,
+                "duplicates": self.duplicates,
+                "retries": self.retries,
+                "mb": self.bytes / 1024 / 1024,
+                "seconds": elapsed,
+                "mb_per_second": self.bytes / 1024 / 1024 / elapsed if elapsed else 0,
+                "images_per_second": self.images / elapsed if elapsed else 0,
+            }
+
+    def report(self):
+        s = self.summary()
+        return (f"{s['images']} images, {s['failures']} failed, "
+                f"{s['duplicates']} duplicates, "
+                f"{s['mb']:.1f} MB in {s['seconds']:.0f}s "
+                f"({s['mb_per_second']:.2f} MB/s, "
+                f"{s['images_per_second']:.1f} images/s)")
+
+
+class TermJob:
+    """Candidates for one search term, downloaded until ``limit`` succeed."""
+
+    def __init__(self, name, candidates, directory, limit, image_format=None,
+                 category=None):
+        self.name = name
+        self.category = category or os.path.basename(directory)
+        self.candidates = candidates
+        self.directory = directory
+        self.limit = limit
+        self.image_format = image_format
+        self.next_index = 0
+        self.in_flight = 0
+        self.paths = []
+        self.done = threading.Event()
+
+
+class ConcurrentDownloader:
+    """
+    Downloads the images found for many search terms at once.
+
+    All requests share one pooled ``requests`` session, at most
+    ``per_host`` requests hit the same host at a time, and failed requests
+    are retried with exponential backoff. Each term keeps ``limit``
+    downloads in flight and moves on to its next candidate when one fails,
+    so it ends up with ``limit`` images whenever enough candidates work.
+
+    With a ``DedupIndex``, every fetched image is checked against the
+    corpus before it is saved, and duplicates count as failed candidates.
+    With a ``DownloadManifest``, images are saved as ``{category}_{NNN}``
+    under their final names and every outcome is recorded, so later runs
+    can skip what is already done or known to fail.
+    """
+
+    def __init__(self, workers=16, per_host=4, connect_timeout=5,
+                 read_timeout=20, retries=3, backoff=0.5, progress_interval=2.0,
+                 dedup=None, manifest=None):
+        self.workers = workers
+        self.dedup = dedup
+        self.manifest = manifest
+        self.per_host = per_host
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = Progress(progress_interval)
+        self.jobs = []
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._hosts = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self._lock = threading.Lock()
+        # Held from taking a file name to renaming the image into place
+        self._save_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="download")
+
+    def submit(self, name, candidates, directory, limit, image_format=None,
+               category=None):
+        """
+        Start downloading ``candidates`` (records with ``image_link`` and
+        ``image_format``) into ``directory``; returns the ``TermJob``.
+        ``category`` names the files when there is a manifest, and defaults
+        to the directory's name.
+        """
+        os.makedirs(directory, exist_ok=True)
+        job = TermJob(name, candidates, directory, limit, image_format, category)
+        self.jobs.append(job)
+        with self._lock:
+            for _ in range(limit):
+                if not self._start_next(job):
+                    break
+            if not job.in_flight:
+                job.done.set()
+        return job
+
+    def wait(self):
+        """Block until every submitted term is finished; returns the summary."""
+        for job in self.jobs:
+            job.done.wait()
+        self._executor.shutdown()
+        print(f"✅ {self.progress.report()}")
+        return self.progress.summary()
+
+    def _start_next(self, job):
+        # Called with self._lock held
+        if job.next_index >= len(job.candidates):
+            return False
+        index = job.next_index
+        job.next_index += 1
+        job.in_flight += 1
+        self._executor.submit(self._download, job, index)
+        return True
+
+    def _download(self, job, index):
+        candidate = job.candidates[index]
+        with self._lock:
+            if len(job.paths) >= job.limit:
+                # Enough images already; skip the rest quietly
+                job.in_flight -= 1
+                return
+
+        path = None
+        duplicate = False
+        try:
+            path = self._save(job, index, candidate)
+        except DuplicateImage as e:
+            duplicate = True
+            print(f"♻️  {job.name}: {candidate['image_link']}: {e}")
+        except Exception as e:
+            print(f"❌ {job.name}: {candidate['image_link']}: {e}")
+            if self.manifest is not None:
+                self.manifest.finish(candidate["image_link"], FAILED, str(e),
+                                     job.category, job.name)
+
+        with self._lock:
+            job.in_flight -= 1
+            if path:
+                job.paths.append(path)
+            elif len(job.paths) + job.in_flight < job.limit:
+                self._start_next(job)
+            if len(job.paths) >= job.limit or not job.in_flight:
+                job.done.set()
+
+        if path:
+            self.progress.saved(os.path.getsize(path))
+        elif duplicate:
+            self.progress.duplicate()
+        else:
+            self.progress.failed()
+
+    def _save(self, job, index, candidate):
+        image_format = candidate.get("image_format")
+        if job.image_format and image_format != job.image_format:
+            raise ValueError(f"wrong image format {image_format!r}")
+
+        url = candidate["image_link"]
+        data = self.fetch(url)
+        name = os.path.basename(urllib.parse.urlparse(url).path)
+        name = re.sub(r"[^\w.-]", "_", name)[:100] or "image"
+        if image_format and not name.lower().endswith(f".{image_format}"):
+            name = f"{name}.{image_format}"
+        hashes = image_hashes(data) if self.dedup is not None else None
+
+        # Written under a temporary name and renamed into place, so a crash
+        # never leaves half an image under a real name
+        fd, temp = tempfile.mkstemp(prefix=".", suffix=".part", dir=job.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            with self._save_lock:
+                path = self._place(job, index, candidate, name, data, hashes, temp)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        if self.manifest is not None:
+            self.manifest.finish(url, DONE, category=job.category, term=job.name)
+        return path
+
+    def _place(self, job, index, candidate, name, data, hashes, temp):
+        # Called with self._save_lock held. The sequence number is taken,
+        # checked for duplicates and used in one go, so a duplicate gives
+        # it straight back and the numbering has no gaps.
+        url = candidate["image_link"]
+        if self.manifest is not None:
+            extension = (candidate.get("image_format") or
+                         os.path.splitext(name)[1][1:] or "jpg")
+            path = self.manifest.reserve(job.category, job.name, url, job.directory,
+                                         extension, hashlib.sha256(data).hexdigest())
+        else:
+            # Numbered by search rank, like google_images_download does
+            path = os.path.join(job.directory, f"{index + 1}.{name}")
+
+        if self.dedup is not None:
+            kept = self.dedup.claim(data, path, url, hashes)
+            if kept is not None:
+                if self.manifest is not None:
+                    self.manifest.finish(url, DUPLICATE, f"duplicate of {kept}",
+                                         job.category, job.name)
+                raise DuplicateImage(f"duplicate of {kept}")
+
+        try:
+            os.replace(temp, path)
+        except OSError as e:
+            if self.dedup is not None:
+                # Or later copies would count as duplicates of nothing
+                self.dedup.release(path)
+            if self.manifest is not None:
+                self.manifest.finish(url, FAILED, str(e), job.category, job.name)
+            raise
+        return path
+
+    def fetch(self, url):
+        """GET ``url`` with per-host limits and retries; returns the body."""
+        host = urllib.parse.urlparse(url).netloc
+        with self._lock:
+            semaphore = self._hosts[host]
+
+        for attempt in range(self.retries + 1):
+            try:
+                with semaphore:
+                    response = self.session.get(url, timeout=self.timeout)
+                    if response.status_code in RETRY_STATUSES:
+                        raise RetryableError(f"HTTP {response.status_code}")
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "image/")
+                    if not content_type.startswith("image/"):
+                        raise ValueError(f"not an image ({content_type})")
+                    return response.content
+            except (RetryableError, requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                self.progress.retried()
+                # Exponential backoff with jitter, outside the host slot
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
@@ -2,6 +2,8 @@ import re
 import urllib.parse
 from google_images_download import google_images_download
 
+import html_scanner
+
 
 class CustomGoogleImagesDownload(google_images_download.googleimagesdownload):
     """
@@ -14,6 +16,17 @@ class CustomGoogleImagesDownload(google_images_download.googleimagesdownload):
         Override the _get_next_item function to work with the new Google
         Images HTML layout. The new layout uses different HTML structure
         without the 'rg_meta notranslate' class.
+
+        Returns the first image in ``s`` in document order and the offset
+        just past it, so ``_get_all_items``' slicing loop visits every image.
+        """
+        return html_scanner.next_item(s)
+
+    def _get_next_item_regex(self, s):
+        """
+        The previous multi-pattern _get_next_item: thumbnails first, then
+        redirect links, then direct image URLs, each searched over the
+        whole of ``s`` on every call.
         """
         # First, try to find Google's own thumbnail URLs (often more reliable)
         thumbnail_url = self._extract_google_thumbnail_urls(s)
@@ -397,3 +410,39 @@ class CustomGoogleImagesDownload(google_images_download.googleimagesdownload):
                     return url
         
         return None
+
+    def find_items(self, arguments, max_items):
+        """
+        Run the search described by ``arguments`` (the same dict
+        ``download`` takes) and return up to ``max_items`` formatted image
+        records, without downloading any of them.
+        """
+        arguments = dict(arguments)
+        for arg in google_images_download.args_list:
+            arguments.setdefault(arg, None)
+
+        params = self.build_url_parameters(arguments)
+        url = self.build_search_url(
+            arguments['keywords'], params, arguments['url'],
+            arguments['similar_images'], arguments['specific_site'],
+            arguments['safe_search'])
+        # Like download(): a plain fetch covers the first 100 results, and
+        # only deeper searches need Chrome to scroll the page
+        limit = int(arguments['limit']) if arguments['limit'] else 100
+        if limit < 101:
+            page = self.download_page(url)
+        else:
+            page = self.download_extended_page(url, arguments['chromedriver'])
+
+        items = []
+        seen_urls = set()
+        # One pass over the page instead of re-scanning a slice per item
+        for item, _ in html_scanner.scan_items(page):
+            if len(items) >= max_items:
+                break
+            item = self.format_object(item)
+            if item['image_link'] in seen_urls:
+                continue
+            seen_urls.add(item['image_link'])
+            items.append(item)
+        return items
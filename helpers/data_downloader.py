@@ -1,5 +1,7 @@
 import os
-import glob
+from concurrent_downloader import ConcurrentDownloader
+from dedup_index import DedupIndex
+from download_manifest import DownloadManifest
 from custom_google_images_download import CustomGoogleImagesDownload
 
 # Sample categories with search strings
@@ -35,49 +37,46 @@ output_dir = "nature_meditation_images"
 # Number of images per search term
 limit = 5
 
+# Search results to collect per missing image, so failed downloads can
+# be replaced
+candidates_per_image = 3
 
-def rename_downloaded_files(output_dir, category):
-    """
-    Rename downloaded files in a category folder to use auto-incremental
-    numbers
-    """
-    category_path = os.path.join(output_dir, f"output/{category}")
-    
-    if not os.path.exists(category_path):
-        print(f"Warning: Directory {category_path} does not exist")
-        return
-    
-    # Get all jpg files in the directory
-    jpg_files = glob.glob(os.path.join(category_path, "*.jpg"))
-    
-    if not jpg_files:
-        print(f"No JPG files found in {category_path}")
-        return
-    
-    # Sort files by modification time to maintain download order
-    jpg_files.sort(key=os.path.getmtime)
-    
-    # Rename files to incremental numbers
-    for i, old_file in enumerate(jpg_files, 1):
-        new_filename = f"{category}_{i:03d}.jpg"
-        new_file_path = os.path.join(category_path, new_filename)
-        
-        # Only rename if the new name is different
-        if old_file != new_file_path:
-            try:
-                os.rename(old_file, new_file_path)
-                old_name = os.path.basename(old_file)
-                print(f"Renamed: {old_name} -> {new_filename}")
-            except OSError as e:
-                print(f"Error renaming {old_file}: {e}")
+# Parallel downloads in total, and against any single host
+workers = 16
+per_host = 4
 
+# Images already in the corpus, so other search terms don't save them again
+dedup = DedupIndex(os.path.join(output_dir, "dedup.db"))
+# Forget images deleted since the last run, so they can be fetched again
+pruned = dedup.prune(output_dir)
+if pruned:
+    print(f"🧹 Forgot {pruned} deleted images")
+
+# Every URL tried and how it went, so re-runs only fetch what's missing
+# and files keep their {category}_NNN names
+manifest = DownloadManifest(os.path.join(output_dir, "manifest.db"))
+
+
+# Search terms one at a time (the browser is the bottleneck) while the
+# images found so far download in the background
+pipeline = ConcurrentDownloader(workers=workers, per_host=per_host,
+                                dedup=dedup, manifest=manifest)
 
-# Loop through categories and download images
 for category, search_terms in search_data.items():
     print(f"\n📁 Processing category: {category}")
-    
+    category_dir = os.path.join(output_dir, f"output/{category}")
+    # Number after images a run without a manifest left behind
+    manifest.adopt(category, category_dir)
+    if manifest.done(category) >= limit * len(search_terms):
+        print(f"✅ {category} already has its images")
+        continue
+
     for term in search_terms:
-        print(f"Downloading: {term}")
+        needed = manifest.needed(category, term, limit)
+        if not needed:
+            print(f"✅ {term}: already has {limit} images")
+            continue
+        print(f"Searching: {term} ({needed} more needed)")
         arguments = {
             "keywords": term,
             "limit": limit,
@@ -89,13 +88,21 @@ for category, search_terms in search_data.items():
             "safe_search": True
         }
         try:
-            downloader.download(arguments)
+            # Search deep enough to get past the results tried before
+            candidates = downloader.find_items(
+                arguments,
+                needed * candidates_per_image + manifest.tried(category, term))
         except Exception as e:
-            print(f"Error downloading {term}: {e}")
-    
-    # Rename all files in this category to use incremental numbers
-    print(f"🔄 Renaming files in {category} category...")
-    rename_downloaded_files(output_dir, category)
+            print(f"Error searching {term}: {e}")
+            continue
+        known = manifest.known(c["image_link"] for c in candidates)
+        candidates = [c for c in candidates if c["image_link"] not in known]
+        pipeline.submit(
+            term, candidates, category_dir, needed,
+            image_format=arguments["format"], category=category
+        )
+
+pipeline.wait()
 
 
 print("\n✅ Download complete!")
@@ -0,0 +1,277 @@
+"""
+Persistent index of downloaded images for skipping duplicates.
+
+Exact copies are found by SHA-256 and near copies (re-encodes, other
+thumbnail sizes of the same photo) by perceptual difference hashes within
+a small Hamming distance. Candidates are looked up by the row hash in a
+BK-tree and only count as copies when the column hash agrees too: dark,
+low-detail photos (night skies, dusky seas) often share a row hash
+without being the same picture.
+
+    python dedup_index.py nature_meditation_images/output --dry-run
+    python dedup_index.py nature_meditation_images/output
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+DEFAULT_INDEX = "nature_meditation_images/dedup.db"
+
+# Bits that may differ between two 64-bit hashes of the same photo.
+# On the photos under images/, half-size re-encodes stay within 4 on both
+# hashes, and no two different photos are within 8 on both.
+DEFAULT_THRESHOLD = 4
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    sha256 TEXT PRIMARY KEY,
+    dhash TEXT,
+    vhash TEXT,
+    path TEXT NOT NULL,
+    url TEXT,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_by_path ON images (path);
+"""
+
+
+def image_dhashes(data, hash_size=8):
+    """
+    Perceptual difference hashes of encoded image bytes as ``(row, column)``
+    ints, comparing each pixel of a tiny grayscale copy with its right and
+    lower neighbour, or ``None`` when they can't be decoded. Resized or
+    re-encoded copies of the same photo get the same or very close hashes.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("L").resize((hash_size + 1, hash_size + 1),
+                                          Image.Resampling.BILINEAR)
+            pixels = img.tobytes()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    width = hash_size + 1
+    rows = columns = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            pixel = pixels[row * width + col]
+            rows = (rows << 1) | (pixel > pixels[row * width + col + 1])
+            columns = (columns << 1) | (pixel > pixels[(row + 1) * width + col])
+    return rows, columns
+
+
+def image_hashes(data):
+    """``(sha256, dhashes)`` of encoded image bytes, for ``DedupIndex.claim``."""
+    return hashlib.sha256(data).hexdigest(), image_dhashes(data)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of hashes under Hamming distance. A search for
+    everything within ``radius`` of a hash only visits the subtrees the
+    triangle inequality can't rule out.
+    """
+
+    def __init__(self):
+        # [hash, value, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, key, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(key, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, value, {}]
+                return
+            node = child
+
+    def search(self, key, radius):
+        """``(distance, value)`` of every entry within ``radius``, closest first."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                found.append((distance, node[1]))
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda match: match[0])
+
+
+class DedupIndex:
+    """
+    Images already in the corpus, by content hash and perceptual hash,
+    persisted in SQLite and mirrored in memory for lookups.
+
+    ``claim`` is the one call downloaders need: it either records a new
+    image or returns the path of the copy already kept. It is thread-safe,
+    so two workers fetching the same photo at once keep only one.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._load()
+
+    def _load(self):
+        # sha256 -> path and column hash, and the row hashes in a BK-tree
+        self._paths = {}
+        self._columns = {}
+        self._tree = BKTree()
+        for sha256, dhash, vhash, path in self._connection.execute(
+                "SELECT sha256, dhash, vhash, path FROM images"):
+            self._paths[sha256] = path
+            if dhash is not None:
+                self._columns[sha256] = int(vhash, 16)
+                self._tree.add(int(dhash, 16), sha256)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def _match(self, sha256, dhashes):
+        # Called with self._lock held
+        if sha256 in self._paths:
+            return self._paths[sha256]
+        if dhashes is not None:
+            rows, columns = dhashes
+            for _, match in self._tree.search(rows, self.threshold):
+                if hamming(columns, self._columns[match]) <= self.threshold:
+                    return self._paths[match]
+        return None
+
+    def claim(self, data, path, url=None, hashes=None):
+        """
+        Record ``data`` as the image kept at ``path`` unless the index
+        already has it elsewhere; returns the existing path or ``None``.
+        ``hashes`` from ``image_hashes(data)`` saves hashing it again.
+        """
+        sha256, dhashes = hashes or image_hashes(data)
+        with self._lock:
+            duplicate = self._match(sha256, dhashes)
+            if duplicate is not None and duplicate != path:
+                if sha256 in self._paths:
+                    self.exact_duplicates += 1
+                else:
+                    self.near_duplicates += 1
+                return duplicate
+            if duplicate is None:
+                self._paths[sha256] = path
+                rows = columns = None
+                if dhashes is not None:
+                    rows, columns = dhashes
+                    self._columns[sha256] = columns
+                    self._tree.add(rows, sha256)
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)",
+                        (sha256, None if rows is None else f"{rows:016x}",
+                         None if columns is None else f"{columns:016x}",
+                         path, url, time.time()))
+            return None
+
+    def _forget(self, paths):
+        # Called with self._lock held
+        if paths:
+            with self._connection:
+                self._connection.executemany(
+                    "DELETE FROM images WHERE path = ?", [(path,) for path in paths])
+            # A BK-tree can't delete, so rebuild it
+            self._load()
+
+    def release(self, path):
+        """Forget the image claimed for ``path`` when it couldn't be saved."""
+        with self._lock:
+            self._forget([path])
+
+    def prune(self, root=""):
+        """Forget indexed images under ``root`` whose files are gone."""
+        with self._lock:
+            missing = [path for path in self._paths.values()
+                       if path.startswith(root) and not os.path.exists(path)]
+            self._forget(missing)
+        return len(missing)
+
+    def stats(self):
+        return {"images": len(self), "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates,
+                "threshold": self.threshold}
+
+
+def dedup_tree(root, index, dry_run=False):
+    """
+    Keep the first copy of every image under ``root`` (in path order) and
+    delete the later ones, or only list them with ``dry_run``; returns
+    ``[(duplicate, kept)]``.
+    """
+    index.prune(root)
+    duplicates = []
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            kept = index.claim(data, path)
+            if kept is None or kept == path:
+                continue
+            duplicates.append((path, kept))
+            print(f"♻️  {path} duplicates {kept}")
+            if not dry_run:
+                os.remove(path)
+    return duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", nargs="?", default="nature_meditation_images/output",
+                        help="Image tree to deduplicate")
+    parser.add_argument("--index", default=DEFAULT_INDEX)
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="Max differing perceptual-hash bits for a duplicate")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="List duplicates within the tree without deleting "
+                             "or indexing anything")
+    args = parser.parse_args()
+
+    # A dry run compares the tree against itself and leaves the index alone
+    index = DedupIndex(":memory:" if args.dry_run else args.index, args.threshold)
+    duplicates = dedup_tree(args.root, index, args.dry_run)
+    action = "Found" if args.dry_run else "Removed"
+    print(f"✅ {action} {len(duplicates)} duplicates; {len(index)} images indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Manifest of every image URL the downloader has tried, for incremental runs.
+
+Each row records one attempt at a URL for a search term: its category,
+status, content hash and final ``{category}_{NNN}.{ext}`` filename. The
+same URL can turn up under several terms, and each term's attempt is kept
+apart, so one term's failure never touches another's saved image. Sequence numbers come from a
+per-category counter in the manifest, so names are stable across runs and
+the output directories are never rescanned. A number is only taken once
+an image is written under a temporary name and known not to be a
+duplicate, right before it is renamed into place, so numbers have no gaps
+and a crash leaves either a complete image or nothing. The next run picks
+up where it stopped.
+
+    python download_manifest.py                 # progress per category/term
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_MANIFEST = "nature_meditation_images/manifest.db"
+
+SAVING = "saving"
+DONE = "done"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    url TEXT,
+    category TEXT NOT NULL,
+    term TEXT,
+    status TEXT NOT NULL,
+    sha256 TEXT,
+    filename TEXT,
+    sequence INTEGER,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (url, category, term)
+);
+CREATE INDEX IF NOT EXISTS downloads_by_term ON downloads (category, term, status);
+CREATE TABLE IF NOT EXISTS categories (
+    category TEXT PRIMARY KEY,
+    next_sequence INTEGER NOT NULL
+);
+"""
+
+
+class DownloadManifest:
+    """
+    Status of every image URL tried, in SQLite, shared by download threads.
+
+    ``reserve`` gives a fetched image its final path and sequence number
+    just before it is renamed into place, ``finish`` records how it ended,
+    and ``needed``
+    and ``known`` tell the next run what is still missing.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self.recover()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._connection:
+            return self._connection.execute(sql, params).fetchall()
+
+    def recover(self):
+        """
+        Settle images that were being saved when a previous run stopped.
+        Returns how many were complete.
+        """
+        rows = self._execute(
+            "SELECT id, filename, category, sequence FROM downloads "
+            "WHERE status = ? ORDER BY sequence DESC", (SAVING,))
+        complete = 0
+        for row_id, path, category, sequence in rows:
+            if os.path.exists(path):
+                # Renamed into place, so the file is whole
+                self._execute("UPDATE downloads SET status = ? WHERE id = ?",
+                              (DONE, row_id))
+                complete += 1
+            else:
+                with self._lock, self._connection:
+                    self._release(category, sequence)
+                    self._connection.execute(
+                        "DELETE FROM downloads WHERE id = ?", (row_id,))
+        return complete
+
+    def _release(self, category, sequence):
+        # Called with self._lock held: give ``sequence`` back if it was the
+        # last one handed out, so unsaved images don't leave gaps
+        self._connection.execute(
+            "UPDATE categories SET next_sequence = next_sequence - 1 "
+            "WHERE category = ? AND next_sequence = ?", (category, sequence + 1))
+
+    def adopt(self, category, directory):
+        """
+        Start ``category``'s counter after any ``{category}_NNN`` files a
+        run without a manifest left in ``directory``, and record them as
+        done. Only looks at the directory the first time it sees ``category``.
+        """
+        with self._lock:
+            if self._connection.execute(
+                    "SELECT 1 FROM categories WHERE category = ?",
+                    (category,)).fetchone():
+                return
+        pattern = re.compile(rf"^{re.escape(category)}_(\d+)\.\w+$")
+        existing = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                match = pattern.match(name)
+                if match:
+                    existing.append((int(match.group(1)), os.path.join(directory, name)))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO downloads (category, status, filename, sequence, "
+                "updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(category, DONE, path, sequence, time.time())
+                 for sequence, path in existing])
+            self._connection.execute(
+                "INSERT OR IGNORE INTO categories VALUES (?, ?)",
+                (category, max((sequence for sequence, _ in existing), default=0) + 1))
+
+    def done(self, category, term=None):
+        """Images saved for ``category``, or only for one of its terms."""
+        if term is None:
+            sql, params = ("SELECT COUNT(*) FROM downloads WHERE category = ? "
+                           "AND status = ?", (category, DONE))
+        else:
+            sql, params = ("SELECT COUNT(*) FROM downloads WHERE category = ? "
+                           "AND term = ? AND status = ?", (category, term, DONE))
+        return self._execute(sql, params)[0][0]
+
+    def tried(self, category, term):
+        """URLs already tried for ``term``, whatever the outcome."""
+        return self._execute(
+            "SELECT COUNT(*) FROM downloads WHERE category = ? AND term = ?",
+            (category, term))[0][0]
+
+    def needed(self, category, term, limit):
+        """How many more images ``term`` needs to reach ``limit``."""
+        return max(limit - self.done(category, term), 0)
+
+    def known(self, urls):
+        """The subset of ``urls`` already tried, whatever the outcome."""
+        urls = list(urls)
+        known = set()
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            known.update(url for (url,) in self._execute(
+                "SELECT url FROM downloads WHERE url IN "
+                f"({', '.join('?' * len(chunk))})", chunk))
+        return known
+
+    def reserve(self, category, term, url, directory, extension, sha256=None):
+        """
+        Take the next sequence number in ``category`` for ``url``, found by
+        search ``term``, and return the path to save it at. Call it once the
+        image is written under a temporary name, rename that into place,
+        then call ``finish``.
+        Reservations that end any other way give their number back only if
+        nothing was reserved after them, so callers serialize reserving and
+        renaming to keep the numbering free of gaps.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT next_sequence FROM categories WHERE category = ?",
+                (category,)).fetchone()
+            sequence = row[0] if row else 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO categories VALUES (?, ?)",
+                (category, sequence + 1))
+            path = os.path.join(directory, f"{category}_{sequence:03d}.{extension}")
+            # Only ever replaces this term's own earlier attempt at ``url``
+            self._connection.execute(
+                "INSERT OR REPLACE INTO downloads (url, category, term, status, "
+                "sha256, filename, sequence, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, category, term, SAVING, sha256, path, sequence, time.time()))
+        return path
+
+    def finish(self, url, status, error=None, category=None, term=None):
+        """
+        Record how the attempt at ``url`` for ``category`` and ``term``
+        ended. A reserved image that isn't saved gives its sequence number
+        back when nothing was reserved after it.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id, category, sequence, status FROM downloads "
+                "WHERE url = ? AND category = ? AND term IS ?",
+                (url, category, term)).fetchone()
+            if row is None:
+                self._connection.execute(
+                    "INSERT INTO downloads (url, category, term, status, error, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, category, term, status, error, time.time()))
+                return
+            row_id, category, sequence, previous = row
+            if previous == DONE:
+                # Saved already; a late failure report can't take it back
+                return
+            if status != DONE and sequence is not None:
+                self._release(category, sequence)
+                self._connection.execute(
+                    "UPDATE downloads SET filename = NULL, sequence = NULL "
+                    "WHERE id = ?", (row_id,))
+            self._connection.execute(
+                "UPDATE downloads SET status = ?, error = ?, updated_at = ? "
+                "WHERE id = ?", (status, error, time.time(), row_id))
+
+    def summary(self):
+        """``{category: {term: {status: count}}}``; adopted files have no term."""
+        summary = {}
+        for category, term, status, count in self._execute(
+                "SELECT category, term, status, COUNT(*) FROM downloads "
+                "GROUP BY category, term, status ORDER BY category, term"):
+            summary.setdefault(category, {}).setdefault(term or "", {})[status] = count
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+    print(json.dumps(DownloadManifest(args.manifest).summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Single-pass scanner for image records in a Google Images results page.
+
+Every quoted URL in the page is found by one precompiled pattern in a
+single left-to-right pass, and classified as it is reached:
+
+* Google's own thumbnails (encrypted-tbn, googleusercontent, storage)
+* ``/url?...&url=...`` result links that point straight at an image
+* direct links to image files
+* any other ``<img src>`` that isn't part of Google's page chrome
+
+Records come out lazily in document order, each with the offset just past
+the URL it came from.
+"""
+
+import html
+import re
+import urllib.parse
+
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "gif", "bmp", "webp", "svg")
+
+# Quoted absolute URLs and Google redirect links. The pattern starts with a
+# literal quote so the regex engine can skip ahead to candidates quickly.
+URL_PATTERN = re.compile(r'"((?:https?://|/url\?)[^"]*)"')
+THUMBNAIL_PATTERN = re.compile(
+    r"^https://(?:encrypted-tbn\d\.gstatic\.com/"
+    r"|[^/]*\.googleusercontent\.com/"
+    r"|storage\.googleapis\.com/.*\.(?:jpg|jpeg|png|gif|webp)$)",
+    re.IGNORECASE,
+)
+IMAGE_URL_PATTERN = re.compile(
+    r"\.(jpg|jpeg|png|gif|bmp|webp|svg)(?:$|[?#&])", re.IGNORECASE)
+SIZE_PATTERN = re.compile(r"=s\d+")
+
+SMALL_THUMBNAIL_SIZES = ("=s24", "=s48", "=w24", "=h24")
+# Google's page chrome and tiny images that aren't search results
+SKIP_WORDS = ("googlelogo", "google.com", "gstatic", "thumb", "small", "icon")
+
+
+def image_format(url, default="jpg"):
+    ext = url.split(".")[-1].lower().split("?")[0]
+    return ext if ext in IMAGE_EXTENSIONS else default
+
+
+def make_record(url):
+    """A record in the raw format ``googleimagesdownload.format_object`` reads."""
+    return {
+        'ou': url,                  # image_link
+        'ity': image_format(url),   # image_format
+        'oh': 0,                    # image_height
+        'ow': 0,                    # image_width
+        'pt': '',                   # image_description
+        'rh': '',                   # image_host
+        'ru': url,                  # image_source
+        'tu': url,                  # image_thumbnail_url
+    }
+
+
+def classify(url, is_src=False):
+    """
+    The image URL a quoted URL in the page stands for, or ``None``;
+    ``is_src`` says whether it is the value of a ``src`` attribute.
+    """
+    url = html.unescape(url)
+
+    if url.startswith("/url?"):
+        # Result links: only useful when they point straight at an image
+        if not IMAGE_URL_PATTERN.search(url):
+            return None
+        target = urllib.parse.parse_qs(urllib.parse.urlparse(url).query).get("url")
+        if target and IMAGE_URL_PATTERN.search(target[0]):
+            return target[0]
+        return None
+
+    if THUMBNAIL_PATTERN.match(url):
+        if any(size in url for size in SMALL_THUMBNAIL_SIZES):
+            return None
+        # Ask for a larger rendition of resizable thumbnails
+        return SIZE_PATTERN.sub("=s400", url) if "=s" in url else url
+
+    lowered = url.lower()
+    if any(word in lowered for word in SKIP_WORDS):
+        return None
+    if is_src or IMAGE_URL_PATTERN.search(url):
+        return url
+    return None
+
+
+def scan_items(page, start=0):
+    """
+    Yield ``(record, end)`` for every image in ``page`` in document order,
+    where ``end`` is the offset just past the URL the record came from.
+    """
+    for match in URL_PATTERN.finditer(page, start):
+        url = classify(match.group(1), page.endswith("src=", 0, match.start()))
+        if url is not None:
+            yield make_record(url), match.end()
+
+
+def next_item(page):
+    """Drop-in for ``_get_next_item``: the first record and its end offset."""
+    return next(scan_items(page), ("no_links", 0))
@@ -0,0 +1,174 @@
+"""
+Pack the image corpus into one memory-mapped file of model-ready pixels.
+
+Every image is decoded, EXIF-rotated and resized to the vision encoder's
+input size once, by the same ``ImagePreprocessor`` the server uses, and
+stored as a ``uint8`` array of shape ``(images, height, width, 3)`` in a
+``.npy`` file. A JSON index next to it lists each image's category,
+original path and SHA-256. Images are grouped by category, so a category is
+one contiguous slice and batches are views into the mapped file.
+
+    python image_dataset.py build               # pack images/ into .cache/
+    python image_dataset.py benchmark           # JPEG decode vs packed reads
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import ImagePreprocessor
+from response_cache import file_sha256
+
+DEFAULT_PATH = ".cache/images.npy"
+DEFAULT_SIZE = (768, 768)
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def corpus(root="images"):
+    """``(category, path)`` for the nature categories and the indoor samples."""
+    samples = []
+    for category_dir in sorted(glob.glob(os.path.join(root, "nature_meditation_images/output/*"))):
+        paths = sorted(glob.glob(os.path.join(category_dir, "*.jpg")))
+        samples += [(os.path.basename(category_dir), path) for path in paths]
+    samples += [("indoor", path) for path in sorted(glob.glob(os.path.join(root, "*.jp*g")))]
+    return samples
+
+
+def build(samples, path=DEFAULT_PATH, size=DEFAULT_SIZE):
+    """
+    Pack ``samples`` (``(category, path)`` pairs) into ``path`` and its
+    index. Does nothing when the existing pack already holds the same files
+    at the same size. Returns the index.
+    """
+    samples = sorted(samples, key=lambda sample: sample[0])
+    images = [{"category": category, "path": image_path,
+               "sha256": file_sha256(image_path)}
+              for category, image_path in samples]
+    index = {"size": list(size), "images": images, "categories": {}}
+    for row, image in enumerate(images):
+        start, _ = index["categories"].get(image["category"], (row, row))
+        index["categories"][image["category"]] = [start, row + 1]
+
+    try:
+        with open(index_path(path), encoding="utf-8") as f:
+            if json.load(f) == index and os.path.exists(path):
+                return index
+    except (OSError, ValueError):
+        pass
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    preprocess = ImagePreprocessor(size)
+    width, height = size
+    # Written beside the old pack and swapped in, so readers never see half
+    partial = path + ".partial.npy"
+    pixels = np.lib.format.open_memmap(
+        partial, mode="w+", dtype=np.uint8, shape=(len(images), height, width, 3))
+    for row, image in enumerate(images):
+        pixels[row] = np.asarray(preprocess(image["path"]))
+    pixels.flush()
+    del pixels
+
+    with open(index_path(partial), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(partial, path)
+    os.replace(index_path(partial), index_path(path))
+    return index
+
+
+class ImageDataset:
+    """
+    Read-only view of a packed corpus. ``pixels`` is the memory-mapped
+    ``(images, height, width, 3)`` array, and ``images`` the index rows in
+    the same order. Nothing is read from disk until a batch is touched.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(index_path(path), encoding="utf-8") as f:
+            index = json.load(f)
+        self.size = tuple(index["size"])
+        self.images = index["images"]
+        self.categories = {name: tuple(bounds)
+                           for name, bounds in index["categories"].items()}
+        self.pixels = np.load(path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, row):
+        """``(index row, pixels)`` of one image; the pixels are a view."""
+        return self.images[row], self.pixels[row]
+
+    def image(self, row):
+        """A PIL image backed by the mapped pixels of ``row``."""
+        return Image.fromarray(self.pixels[row], "RGB")
+
+    def batches(self, batch_size, category=None):
+        """
+        Yield ``(index rows, pixels)`` batches, optionally of one
+        ``category``. ``pixels`` is a ``(batch, height, width, 3)`` slice of
+        the mapped file, not a copy.
+        """
+        start, stop = self.categories[category] if category else (0, len(self))
+        for first in range(start, stop, batch_size):
+            last = min(first + batch_size, stop)
+            yield self.images[first:last], self.pixels[first:last]
+
+
+def benchmark(dataset, batch_size=8, repeat=3):
+    """Images per second decoding the original JPEGs vs reading the pack."""
+    preprocess = ImagePreprocessor(dataset.size)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for image in dataset.images:
+            np.asarray(preprocess(image["path"]))
+    decode_seconds = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    checksum = 0
+    for _ in range(repeat):
+        for _, pixels in dataset.batches(batch_size):
+            # Touch every pixel so the pages are really read
+            checksum += int(pixels.sum(dtype=np.uint64))
+    packed_seconds = (time.perf_counter() - started) / repeat
+
+    return {
+        "images": len(dataset),
+        "jpeg_images_per_second": len(dataset) / decode_seconds,
+        "packed_images_per_second": len(dataset) / packed_seconds,
+        "speedup": decode_seconds / packed_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["build", "benchmark"])
+    parser.add_argument("--root", default="images")
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    parser.add_argument("--size", type=int, nargs=2, default=DEFAULT_SIZE,
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="The vision encoder's input size")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build(corpus(args.root), args.output, tuple(args.size))
+    print(f"Packed {len(index['images'])} images into {args.output} "
+          f"in {time.perf_counter() - started:.1f}s")
+    if args.command == "benchmark":
+        print(json.dumps(benchmark(ImageDataset(args.output), args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+
+class ImagePreprocessor:
+    """
+    Decodes an uploaded photo once and shrinks it to the vision encoder's
+    input size before it reaches the Gemma processor.
+
+    JPEGs are decoded at a reduced scale when possible (``Image.draft``), so
+    multi-megapixel phone photos never get fully expanded in memory. EXIF
+    orientation is applied so rotated photos reach the model upright.
+    """
+
+    def __init__(self, size=(768, 768), resample=Image.Resampling.BILINEAR):
+        self.size = size
+        self.resample = resample
+        self.count = 0
+        self.decode_seconds = 0.0
+        self.resize_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, image):
+        """Return an RGB image of ``self.size`` for a path or PIL image."""
+        start = time.perf_counter()
+        if not isinstance(image, Image.Image):
+            with Image.open(image) as img:
+                # Let the JPEG decoder downscale by up to 8x while decoding
+                img.draft("RGB", self.size)
+                image = ImageOps.exif_transpose(img)
+                image.load()
+        decoded = time.perf_counter()
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != self.size:
+            image = image.resize(self.size, self.resample, reducing_gap=2.0)
+        resized = time.perf_counter()
+
+        with self._lock:
+            self.count += 1
+            self.decode_seconds += decoded - start
+            self.resize_seconds += resized - decoded
+        return image
+
+    def stats(self):
+        with self._lock:
+            count = self.count or 1
+            return {
+                "images": self.count,
+                "mean_decode_ms": self.decode_seconds / count * 1000,
+                "mean_resize_ms": self.resize_seconds / count * 1000,
+            }
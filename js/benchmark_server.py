@@ -0,0 +1,125 @@
+"""
+Benchmark concurrent download throughput of js/server.py.
+
+Serves a file with the old single-threaded TCPServer and with the current
+server, downloads it from several clients at once and prints JSON with the
+aggregate throughput and per-download latency of each.
+
+    python js/benchmark_server.py --clients 8 --size-mb 256
+    python js/benchmark_server.py --file js/gemma-3n-...-int4-v1.tar.gz
+"""
+
+import argparse
+import concurrent.futures
+import http.client
+import http.server
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import server  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+def download(port, name, chunk_size=1024 * 1024, byte_range=None):
+    """Download ``name``; returns ``(bytes, seconds)``."""
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    headers = {"Range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else {}
+    connection.request("GET", f"/{name}", headers=headers)
+    response = connection.getresponse()
+    received = 0
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+    connection.close()
+    return received, time.perf_counter() - start
+
+
+def run(server_class, handler_class, directory, name, size, clients, rounds):
+    handler = lambda *args, **kwargs: handler_class(  # noqa: E731
+        *args, directory=directory, **kwargs)
+    with server_class(("127.0.0.1", 0), handler) as httpd:
+        port = httpd.server_address[1]
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(lambda _: download(port, name),
+                                    range(clients * rounds)))
+        elapsed = time.perf_counter() - started
+        httpd.shutdown()
+
+    received = sum(nbytes for nbytes, _ in results)
+    seconds = [seconds for _, seconds in results]
+    return {
+        "downloads": len(results),
+        "complete": all(nbytes == size for nbytes, _ in results),
+        "throughput_mb_per_second": received / elapsed / 1024 / 1024,
+        "download_p50_seconds": percentile(seconds, 50),
+        "download_p95_seconds": percentile(seconds, 95),
+        "download_max_seconds": max(seconds),
+    }
+
+
+class LegacyServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", help="File to serve (default: a temporary file)")
+    parser.add_argument("--size-mb", type=int, default=128,
+                        help="Size of the temporary file")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="Downloads per client")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="Only benchmark the current server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.file:
+            directory, name = os.path.split(os.path.abspath(args.file))
+        else:
+            directory, name = scratch, "model.tar.gz"
+            with open(os.path.join(directory, name), "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(os.path.join(directory, name))
+
+        report = {"file_mb": size / 1024 / 1024, "clients": args.clients}
+        if not args.skip_legacy:
+            report["legacy"] = run(LegacyServer, http.server.SimpleHTTPRequestHandler,
+                                   directory, name, size, args.clients, args.rounds)
+        report["server"] = run(server.Server, server.CustomHandler,
+                               directory, name, size, args.clients, args.rounds)
+
+        # A resumed download only fetches the missing tail
+        half = size // 2
+        with server.Server(("127.0.0.1", 0), lambda *a, **kw: server.CustomHandler(
+                *a, directory=directory, **kw)) as httpd:
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            received, seconds = download(httpd.server_address[1], name,
+                                         byte_range=(half, size - 1))
+            httpd.shutdown()
+        report["resume"] = {"requested_bytes": size - half, "received_bytes": received,
+                            "seconds": seconds}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,159 @@
+import argparse
+import email.utils
 import http.server
-import socketserver
 import os
+import re
 
 PORT = 8000
+DIRECTORY = "js"
+
+# Assets whose content never changes under the same name: model bundles
+# (renamed in index.js when a new version ships) and content-hashed files
+# like app.3f2a9c1e.js
+IMMUTABLE_PATTERN = re.compile(
+    r"(\.(tar\.gz|task|tflite|bin|litertlm)$)|(\.[0-9a-f]{8,}\.\w+$)"
+)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
 
 class CustomHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory="js", **kwargs)
-    
-    # def end_headers(self):
-    #     self.send_header("Content-Security-Policy", "script-src 'self' 'unsafe-eval';")
-    #     http.server.SimpleHTTPRequestHandler.end_headers(self)
+    """
+    Static file handler for the web demo and its multi-gigabyte model.
+
+    Files go out with ``sendfile`` straight from the page cache, support
+    single byte ranges so interrupted model downloads resume where they
+    stopped, and carry an ETag so browsers can revalidate instead of
+    downloading again. Connections are kept alive between requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, directory=DIRECTORY, **kwargs):
+        super().__init__(*args, directory=directory, **kwargs)
+
+    def send_head(self):
+        self.body_range = None
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            # Directories (index.html, listings, redirects) and 404s
+            return super().send_head()
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        try:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            if etag in self.headers.get("If-None-Match", ""):
+                self.send_response(304)
+                self.send_cache_headers(path, etag, stat)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                f.close()
+                return None
+
+            start, end = 0, stat.st_size - 1
+            byte_range = self.requested_range(etag, stat.st_size)
+            if byte_range == "unsatisfiable":
+                f.close()
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            if byte_range is not None:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+            else:
+                self.send_response(200)
+
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_cache_headers(path, etag, stat)
+            self.end_headers()
+            self.body_range = (start, end - start + 1)
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def send_cache_headers(self, path, etag, stat):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control",
+                         IMMUTABLE_CACHE_CONTROL if IMMUTABLE_PATTERN.search(path)
+                         else REVALIDATE_CACHE_CONTROL)
+
+    def requested_range(self, etag, size):
+        """
+        ``(start, end)`` of a satisfiable single-range request, ``None`` to
+        send the whole file, or ``"unsatisfiable"``.
+        """
+        header = self.headers.get("Range")
+        if not header:
+            return None
+        # A resumed download of a file that has changed since gets all of it
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range != etag:
+            return None
+
+        match = RANGE_PATTERN.match(header.strip())
+        if not match or not any(match.groups()):
+            # Multiple ranges and other units: serve the whole file
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # "bytes=-N" is the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+        if start >= size or start > end:
+            return "unsatisfiable"
+        return start, end
+
+    def copyfile(self, source, outputfile):
+        body_range = self.body_range
+        if body_range is None:
+            # Directory listings are in-memory files
+            return super().copyfile(source, outputfile)
+        self.body_range = None
+        offset, count = body_range
+        if count:
+            # Zero-copy from the page cache when the platform supports it.
+            # sendfile rejects a count of 0, which empty files would pass
+            self.connection.sendfile(source, offset, count)
 
     def end_headers(self):
         # Remove the CSP header line entirely
         http.server.SimpleHTTPRequestHandler.end_headers(self)
 
+
 Handler = CustomHandler
 
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print("Serving at port", PORT)
-    httpd.serve_forever()
\ No newline at end of file
+
+class Server(http.server.ThreadingHTTPServer):
+    # Lots of browsers fetching the page and the model at once
+    request_queue_size = 128
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the web demo")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    with Server(("", args.port), Handler) as httpd:
+        print("Serving at port", args.port)
+        httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
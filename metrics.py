@@ -0,0 +1,156 @@
+import contextlib
+import os
+import threading
+import time
+
+# Set ZEN_METRICS=0 to turn instrumentation into no-ops
+ENABLED = os.environ.get("ZEN_METRICS", "1") != "0"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_NOOP = contextlib.nullcontext()
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def set(self, value):
+        if ENABLED:
+            self.value = value
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        if not ENABLED:
+            return _NOOP
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket = key + (("le", bound),)
+                    lines.append(f"{self.name}_bucket{_labels(bucket)} {count}")
+                lines.append(f'{self.name}_bucket{_labels(key + (("le", "+Inf"),))} {series[-1]}')
+                lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+STAGE_SECONDS = Histogram(
+    "zen_stage_seconds", "Time spent in each stage of a request"
+)
+REQUESTS = Counter("zen_requests_total", "Requests handled")
+ERRORS = Counter("zen_errors_total", "Requests that raised an error")
+INPUT_TOKENS = Counter("zen_input_tokens_total", "Prompt tokens sent to the model")
+OUTPUT_TOKENS = Counter("zen_output_tokens_total", "Tokens generated by the model")
+QUEUE_DEPTH = Gauge("zen_queue_depth", "Requests waiting for the model")
+QUEUE_REJECTIONS = Counter(
+    "zen_queue_rejections_total", "Requests turned away because the queue was full"
+)
+AUDIO_SECONDS = Counter(
+    "zen_audio_seconds_total", "Seconds of uploaded audio, as received and after trimming"
+)
+
+VISION_CACHE = Counter(
+    "zen_vision_cache_total", "Images looked up in the vision embedding cache, by result"
+)
+RESPONSE_CACHE = Counter(
+    "zen_response_cache_total", "Response cache lookups, by result (memory, disk or miss)"
+)
+BATCH_SIZE = Histogram(
+    "zen_batch_size", "Requests run together in one batched generate call",
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+
+REGISTRY = [STAGE_SECONDS, REQUESTS, ERRORS, INPUT_TOKENS, OUTPUT_TOKENS,
+            QUEUE_DEPTH, QUEUE_REJECTIONS, AUDIO_SECONDS, VISION_CACHE, RESPONSE_CACHE,
+            BATCH_SIZE]
+
+
+def stage(name):
+    """Time a stage of request handling, e.g. ``with stage("generate"):``."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
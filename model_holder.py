@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class ModelHolder:
+    """
+    Loads the model on a background thread so callers (like the Gradio UI)
+    don't have to wait for it at import time.
+
+    ``load`` loads the model, ``warmup`` runs a throwaway generation so the
+    first real request doesn't pay for kernel and allocator warmup. Callers
+    that need the model call ``wait()``, which starts loading if nobody has
+    yet.
+    """
+
+    def __init__(self, load, warmup=None, started_at=None):
+        self.load = load
+        self.warmup = warmup
+        self.started_at = started_at or time.perf_counter()
+        self.state = "not loaded"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start loading in the background; safe to call more than once."""
+        with self._lock:
+            if self._thread is None:
+                self.state = "loading"
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            self.load()
+            self.load_seconds = time.perf_counter() - start
+
+            if self.warmup is not None:
+                self.state = "warming up"
+                start = time.perf_counter()
+                self.warmup()
+                self.warmup_seconds = time.perf_counter() - start
+
+            self.state = "ready"
+            self.ready_seconds = time.perf_counter() - self.started_at
+            print(f"Model ready: loaded in {self.load_seconds:.1f}s, "
+                  f"warmed up in {self.warmup_seconds or 0:.1f}s, "
+                  f"{self.ready_seconds:.1f}s after import")
+        except Exception as e:
+            self.state = "failed"
+            self.error = e
+            print(f"Model failed to load: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        """Block until the model is ready. Raises if loading failed."""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Model is still {self.state}")
+        if self.error is not None:
+            raise RuntimeError("Model failed to load") from self.error
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": str(self.error) if self.error else None,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "import_to_ready_seconds": self.ready_seconds,
+        }
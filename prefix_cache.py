@@ -0,0 +1,127 @@
+import copy
+import threading
+
+import torch
+
+
+class PrefixCache:
+    """
+    Keeps the KV state of the fixed part of a conversation (system message
+    plus the instruction prompt) so each request only has to prefill the
+    image and the user-specific tokens that follow it.
+
+    Entries are keyed by the prompt text, so every prompt version gets its
+    own prefix.
+    """
+
+    def __init__(self, model, processor, build_messages, enabled=True):
+        self.model = model
+        self.processor = processor
+        self.build_messages = build_messages
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _tokenize(self, messages):
+        return self.processor.apply_chat_template(
+            messages,
+            add_generation_prompt=False,
+            tokenize=True,
+            return_dict=True,
+            return_tensors="pt",
+        )["input_ids"][0]
+
+    def _prefix_ids(self, prompt):
+        """
+        Token ids shared by every request that uses ``prompt``.
+
+        The chat template closes the user turn after the prompt, so render it
+        twice with different trailing text and keep the common part.
+        """
+        ids_a = self._tokenize(self.build_messages("a", prompt=prompt))
+        ids_b = self._tokenize(self.build_messages("z", prompt=prompt))
+        length = min(len(ids_a), len(ids_b))
+        common = 0
+        while common < length and ids_a[common] == ids_b[common]:
+            common += 1
+        # Leave the last shared token out so tokenizer merges at the
+        # boundary can never make a request miss the prefix.
+        return ids_a[:max(common - 1, 0)]
+
+    def warm(self, prompt):
+        """Compute and store the KV state for ``prompt``."""
+        with self._lock:
+            if prompt in self._entries:
+                return self._entries[prompt]
+
+            prefix_ids = self._prefix_ids(prompt)
+            input_ids = prefix_ids.unsqueeze(0).to(self.model.device)
+            with torch.inference_mode():
+                outputs = self.model(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    use_cache=True,
+                    logits_to_keep=1,
+                )
+            entry = (prefix_ids, outputs.past_key_values)
+            self._entries[prompt] = entry
+            print(f"Prefix cache warmed: {len(prefix_ids)} tokens")
+            return entry
+
+    def prefill(self, inputs, prompt):
+        """
+        Fill a copy of the cached prefix with the rest of ``inputs``.
+
+        Everything but the last input token is prefilled here, including the
+        image and audio features; ``model.generate`` then feeds the last token
+        itself and decodes as usual. Returns the filled cache, or ``None``
+        when the request cannot use the prefix.
+        """
+        if not self.enabled or prompt is None:
+            return None
+
+        prefix_ids, prefix_kv = self.warm(prompt)
+        input_ids = inputs["input_ids"]
+        prefix_len = len(prefix_ids)
+        total_len = input_ids.shape[-1]
+
+        if (input_ids.shape[0] != 1 or total_len <= prefix_len + 1 or
+                not torch.equal(input_ids[0, :prefix_len].cpu(), prefix_ids)):
+            self.misses += 1
+            return None
+
+        cache = copy.deepcopy(prefix_kv)
+        extra = {
+            key: inputs[key]
+            for key in ("pixel_values", "input_features",
+                        "input_features_mask", "token_type_ids")
+            if key in inputs
+        }
+        if "token_type_ids" in extra:
+            extra["token_type_ids"] = extra["token_type_ids"][
+                :, prefix_len:total_len - 1]
+
+        with torch.inference_mode():
+            self.model(
+                input_ids=input_ids[:, prefix_len:total_len - 1],
+                attention_mask=inputs["attention_mask"][:, :total_len - 1],
+                past_key_values=cache,
+                cache_position=torch.arange(
+                    prefix_len, total_len - 1, device=input_ids.device),
+                use_cache=True,
+                logits_to_keep=1,
+                **extra,
+            )
+
+        self.hits += 1
+        return cache
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "prompts": len(self._entries),
+        }
@@ -0,0 +1,135 @@
+"""
+Compare the bf16 model against the quantized CPU inference modes.
+
+Each mode is loaded in its own process (so peak RSS is measured cleanly)
+and run over the bundled sample images. The report covers load time, peak
+RSS, decode throughput and how closely each mode's output matches bf16.
+
+    python quantization_report.py --modes bf16,int8,int4 --output report.json
+"""
+
+import argparse
+import difflib
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def default_images():
+    # Indoor samples plus the first photo of every nature category
+    return (sorted(glob.glob("images/*.jp*g")) +
+            sorted(glob.glob("images/nature_meditation_images/output/*/*_001.jpg")))
+
+
+def run_worker(images, max_new_tokens, output_path):
+    import resource
+
+    import gemma_server
+
+    gemma_server.model_holder.wait()
+
+    samples = []
+    for path in images:
+        start = time.perf_counter()
+        text = gemma_server.generate(
+            "", image_path=path, prompt=gemma_server.ZEN_IMG_PROMPT_v2,
+            max_new_tokens=max_new_tokens
+        )
+        seconds = time.perf_counter() - start
+        tokens = len(gemma_server.processor.tokenizer(
+            text, add_special_tokens=False)["input_ids"])
+        samples.append({
+            "image": path,
+            "seconds": seconds,
+            "tokens": tokens,
+            "text": text,
+        })
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "mode": gemma_server.INFERENCE_MODE,
+            "load_seconds": gemma_server.model_holder.load_seconds,
+            # ru_maxrss is reported in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "samples": samples,
+        }, f, indent=2)
+
+
+def run_mode(mode, images, max_new_tokens):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output_path = f.name
+
+    try:
+        subprocess.run(
+            [sys.executable, __file__, "--worker", "--worker-output", output_path,
+             "--max-new-tokens", str(max_new_tokens), "--images", *images],
+            env={**os.environ, "ZEN_INFERENCE_MODE": mode},
+            check=True,
+        )
+        with open(output_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(output_path)
+
+
+def summarize(result, baseline):
+    samples = result["samples"]
+    seconds = sum(sample["seconds"] for sample in samples)
+    tokens = sum(sample["tokens"] for sample in samples)
+    summary = {
+        "mode": result["mode"],
+        "load_seconds": round(result["load_seconds"], 2),
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        "tokens_per_second": round(tokens / seconds, 2) if seconds else 0.0,
+    }
+
+    if baseline is not None:
+        pairs = list(zip(samples, baseline["samples"]))
+        summary["exact_match_rate"] = round(
+            sum(a["text"] == b["text"] for a, b in pairs) / len(pairs), 3)
+        summary["mean_similarity"] = round(
+            sum(difflib.SequenceMatcher(None, a["text"], b["text"]).ratio()
+                for a, b in pairs) / len(pairs), 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="bf16,int8,int4",
+                        help="Comma separated inference modes to compare")
+    parser.add_argument("--images", nargs="*", default=None,
+                        help="Images to run (defaults to the bundled samples)")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--output", help="Write the full report to this JSON file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    images = args.images or default_images()
+
+    if args.worker:
+        run_worker(images, args.max_new_tokens, args.worker_output)
+        return
+
+    results = {mode: run_mode(mode, images, args.max_new_tokens)
+               for mode in args.modes.split(",")}
+    baseline = results.get("bf16")
+    summaries = [
+        summarize(result, baseline if mode != "bf16" else None)
+        for mode, result in results.items()
+    ]
+
+    for summary in summaries:
+        print(json.dumps(summary))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summaries, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+import metrics
+
+
+def normalize_description(description):
+    """Lowercase and collapse whitespace so trivial edits share a key."""
+    return " ".join((description or "").lower().split())
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_dhash(path, hash_size=8):
+    """
+    Perceptual difference hash of an image, as a hex string. Re-encoded or
+    resized copies of the same photo get the same hash.
+    """
+    with Image.open(path) as img:
+        img = img.convert("L").resize((hash_size + 1, hash_size),
+                                      Image.Resampling.BILINEAR)
+        pixels = list(img.getdata())
+
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+class ResponseCache:
+    """
+    Two-tier cache of generated responses: an in-memory LRU in front of a
+    directory of JSON files. Disk entries expire after ``ttl_seconds`` and
+    the least recently used ones are evicted once the directory grows past
+    ``max_disk_bytes``.
+    """
+
+    def __init__(self, directory, max_memory_entries=256,
+                 max_disk_bytes=100 * 1024 * 1024, ttl_seconds=7 * 24 * 3600,
+                 perceptual=False):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.perceptual = perceptual
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # Sizes of the files on disk, oldest access first, so eviction
+        # doesn't have to rescan the directory on every write
+        self._disk = OrderedDict()
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+        self._disk_bytes = sum(self._disk.values())
+
+    def make_key(self, description, image_path, prompt, generation_params,
+                 audio_path=None):
+        image_hash = None
+        if image_path:
+            image_hash = (image_dhash(image_path) if self.perceptual
+                          else file_sha256(image_path))
+
+        payload = json.dumps({
+            "description": normalize_description(description),
+            "prompt": hashlib.sha256((prompt or "").encode()).hexdigest(),
+            "params": generation_params,
+            "image": image_hash,
+            "audio": file_sha256(audio_path) if audio_path else None,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached response for ``key``, or ``None``."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry["generation_seconds"]
+                metrics.RESPONSE_CACHE.inc(result="memory")
+                return entry["response"]
+
+            entry = self._read_disk(key)
+            if entry is None:
+                self.misses += 1
+                metrics.RESPONSE_CACHE.inc(result="miss")
+                return None
+
+            self._remember(key, entry)
+            self.disk_hits += 1
+            metrics.RESPONSE_CACHE.inc(result="disk")
+            self.saved_seconds += entry["generation_seconds"]
+            return entry["response"]
+
+    def put(self, key, response, generation_seconds):
+        entry = {
+            "response": response,
+            "generation_seconds": generation_seconds,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl_seconds
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+
+        if self._expired(entry):
+            self._forget(key)
+            return None
+
+        # Touch the file so access order survives restarts
+        os.utime(self._path(key))
+        self._disk.move_to_end(key)
+        return entry
+
+    def _write_disk(self, key, entry):
+        data = json.dumps(entry).encode("utf-8")
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        self._disk_bytes += len(data) - self._disk.pop(key, 0)
+        self._disk[key] = len(data)
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            self._forget(next(iter(self._disk)))
+
+    def _forget(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "saved_generation_seconds": self.saved_seconds,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+
+def cache_nbytes(cache):
+    """Memory held by the key/value tensors of a transformers cache."""
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [tensor for layer in layers
+                   for tensor in (getattr(layer, "keys", None),
+                                  getattr(layer, "values", None))]
+    else:
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+    return sum(tensor.nelement() * tensor.element_size()
+               for tensor in tensors if isinstance(tensor, torch.Tensor))
+
+
+class SessionEntry:
+    def __init__(self, prompt, user_turns, turns, ids, past_key_values):
+        self.prompt = prompt
+        self.user_turns = user_turns
+        self.turns = turns
+        # Every token of the conversation so far; the KV cache holds all but
+        # the last one, which generate never fed back through the model
+        self.ids = ids
+        self.past_key_values = past_key_values
+        self.nbytes = cache_nbytes(past_key_values)
+        self.last_used = time.monotonic()
+
+
+class SessionCache:
+    """
+    Keeps the KV cache of each session's conversation so a follow-up turn
+    only has to prefill the new user message, not the image and the
+    earlier turns again.
+
+    Entries are evicted least recently used first once there are more than
+    ``max_sessions`` or they take up more than ``max_bytes``, and dropped
+    after ``idle_seconds`` without a follow-up.
+    """
+
+    def __init__(self, max_sessions=64, max_bytes=512 * 1024 * 1024,
+                 idle_seconds=900):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _user_turns(history):
+        return [turn["content"] for turn in history if turn["role"] == "user"]
+
+    def take(self, session_id, history, prompt=None):
+        """
+        Remove and return the entry for ``session_id`` if it continues
+        ``history`` under the same ``prompt``, or ``None``. The caller owns
+        the entry's cache until it ``put``s the next turn back.
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.bytes -= entry.nbytes
+            if (entry is None or entry.prompt != prompt or
+                    entry.turns != len(history) or
+                    entry.user_turns != self._user_turns(history)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, session_id, history, ids, past_key_values, prompt=None):
+        """
+        Store the cache for ``session_id`` after a turn ending ``history``,
+        built with the activity ``prompt``.
+        """
+        entry = SessionEntry(prompt, self._user_turns(history), len(history),
+                             ids, past_key_values)
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._entries[session_id] = entry
+            self.bytes += entry.nbytes
+            self._evict_idle()
+            while (len(self._entries) > self.max_sessions or
+                   self.bytes > self.max_bytes):
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, entry = self._entries.popitem(last=False)
+        self.bytes -= entry.nbytes
+        self.evictions += 1
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - self.idle_seconds
+        while self._entries and next(iter(self._entries.values())).last_used < deadline:
+            self._evict_oldest()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "mb": self.bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    browser_id TEXT,
+    created_at REAL NOT NULL,
+    description_sha256 TEXT,
+    image_sha256 TEXT,
+    audio_sha256 TEXT,
+    scene TEXT,
+    mode TEXT,
+    response TEXT NOT NULL,
+    ttft_seconds REAL,
+    total_seconds REAL,
+    feedback TEXT,
+    feedback_at REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_browser
+    ON sessions (browser_id, created_at, id);
+CREATE INDEX IF NOT EXISTS favorites_by_browser
+    ON sessions (browser_id, created_at, id) WHERE feedback = 'better';
+"""
+
+INSERT_SESSION = """
+INSERT OR REPLACE INTO sessions (
+    id, browser_id, created_at, description_sha256, image_sha256,
+    audio_sha256, scene, mode, response, ttft_seconds, total_seconds
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_FEEDBACK = "UPDATE sessions SET feedback = ?, feedback_at = ? WHERE id = ?"
+
+COLUMNS = ("id", "created_at", "scene", "mode", "response", "ttft_seconds",
+           "total_seconds", "feedback")
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode()).hexdigest() if text else None
+
+
+class SessionStore:
+    """
+    Persistent history of sessions and their feedback, in SQLite.
+
+    Writes are queued and committed in batches by a background thread, so
+    UI handlers never wait on the disk; they show up in queries within
+    ``flush_seconds``. Pages are read newest first with keyset pagination
+    on an index, so they stay fast however long the history gets. Each
+    browser only sees its own sessions, and feedback of "better" marks a
+    session as a favorite.
+    """
+
+    def __init__(self, path, batch_size=256, flush_seconds=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.writes = 0
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.create(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent with NORMAL; a crash can only
+        # lose the last few batches
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                try:
+                    self._commit(connection, batch)
+                    self.writes += len(batch)
+                except sqlite3.Error:
+                    # Retry one write at a time, so only the bad one is lost
+                    for statements in batch:
+                        try:
+                            self._commit(connection, [statements])
+                            self.writes += 1
+                        except sqlite3.Error as e:
+                            print(f"Session store write failed, dropped one "
+                                  f"of {len(batch)} writes: {e}")
+                self.batches += 1
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _commit(connection, batch):
+        with connection:
+            for statements in batch:
+                for statement, params in statements:
+                    connection.execute(statement, params)
+
+    def record_session(self, response, browser_id=None, description=None,
+                       image_sha256=None, audio_sha256=None, scene=None,
+                       mode=None, ttft_seconds=None, total_seconds=None):
+        """
+        Queue a finished session of ``browser_id``; returns its id for
+        ``record_feedback``.
+        """
+        session_id = uuid.uuid4().hex
+        self.write((INSERT_SESSION, (
+            session_id, browser_id, time.time(), text_sha256(description),
+            image_sha256, audio_sha256, scene, mode, response, ttft_seconds,
+            total_seconds,
+        )))
+        return session_id
+
+    def record_feedback(self, session_id, feedback):
+        self.write((UPDATE_FEEDBACK, (feedback, time.time(), session_id)))
+
+    def write(self, *statements):
+        """
+        Queue ``(sql, params)`` statements for the background writer. They
+        are committed together, in the same transaction.
+        """
+        self._queue.put(statements)
+
+    def read(self, query, params=()):
+        """Run a query on this thread's read connection; returns the rows."""
+        return self._reader().execute(query, params).fetchall()
+
+    def create(self, schema):
+        """Create tables and indexes; runs right away, not write-behind."""
+        connection = self._connect()
+        try:
+            connection.executescript(schema)
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        self._queue.join()
+
+    def _page(self, where, browser_id, cursor, limit):
+        where = f"browser_id = ? AND {where}"
+        params = [browser_id]
+        if cursor is not None:
+            where += " AND (created_at, id) < (?, ?)"
+            params += list(cursor)
+        rows = self.read(
+            f"SELECT {', '.join(COLUMNS)} FROM sessions WHERE {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [limit],
+        )
+        rows = [dict(row) for row in rows]
+        next_cursor = ((rows[-1]["created_at"], rows[-1]["id"])
+                       if len(rows) == limit else None)
+        return rows, next_cursor
+
+    def history(self, browser_id, cursor=None, limit=20):
+        """
+        A page of ``browser_id``'s sessions, newest first. Returns the rows
+        and the cursor for the next page (``None`` on the last page).
+        """
+        return self._page("1", browser_id, cursor, limit)
+
+    def favorites(self, browser_id, cursor=None, limit=20):
+        """A page of sessions the family felt better after, newest first."""
+        return self._page("feedback = 'better'", browser_id, cursor, limit)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "batches": self.batches,
+        }
@@ -0,0 +1,104 @@
+import threading
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+
+class SpeculativeDecoding:
+    """
+    Accelerated decoding for single requests.
+
+    ``prompt_lookup`` proposes the continuation of n-grams already present
+    in the input, which suits responses that quote the activity catalog.
+    ``draft`` proposes tokens with a small draft model. Under greedy decoding
+    both produce the same output as standard decoding, only faster when the
+    proposals are accepted.
+    """
+
+    MODES = ("standard", "prompt_lookup", "draft")
+
+    def __init__(self, mode="standard", num_tokens=10, draft_model_path=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown decoding mode: {mode}")
+        if mode == "draft" and not draft_model_path:
+            raise ValueError("Draft decoding needs a draft model path")
+
+        self.mode = mode
+        self.num_tokens = num_tokens
+        self.draft_model_path = draft_model_path
+        self.draft_model = None
+        self.draft_tokenizer = None
+        self.target_tokenizer = None
+        self.generations = 0
+        self.drafted = 0
+        self.accepted = 0
+        self._lock = threading.Lock()
+
+    def install(self, model, tokenizer):
+        """Load the draft model if needed and start counting acceptances."""
+        if self.mode == "standard":
+            return
+
+        if self.mode == "draft":
+            self.draft_model = AutoModelForCausalLM.from_pretrained(
+                self.draft_model_path,
+                device_map=model.device,
+                torch_dtype=torch.bfloat16
+            ).eval()
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_path)
+            # Tokenizers only need to be passed along when the vocabularies
+            # differ, which makes generate translate between them
+            if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+                self.draft_tokenizer = draft_tokenizer
+                self.target_tokenizer = tokenizer
+
+        get_candidate_generator = model._get_candidate_generator
+
+        def counting_candidate_generator(*args, **kwargs):
+            generator = get_candidate_generator(*args, **kwargs)
+            self._count(generator)
+            return generator
+
+        model._get_candidate_generator = counting_candidate_generator
+
+    def _count(self, generator):
+        get_candidates = generator.get_candidates
+        update_candidate_strategy = generator.update_candidate_strategy
+
+        def counted_get_candidates(input_ids, *args, **kwargs):
+            candidates = get_candidates(input_ids, *args, **kwargs)
+            with self._lock:
+                self.drafted += candidates[0].shape[-1] - input_ids.shape[-1]
+            return candidates
+
+        def counted_update_candidate_strategy(input_ids, scores, num_matches):
+            with self._lock:
+                self.accepted += int(num_matches)
+            return update_candidate_strategy(input_ids, scores, num_matches)
+
+        generator.get_candidates = counted_get_candidates
+        generator.update_candidate_strategy = counted_update_candidate_strategy
+        with self._lock:
+            self.generations += 1
+
+    def generate_kwargs(self):
+        """Extra ``model.generate`` arguments for a single-sequence request."""
+        if self.mode == "prompt_lookup":
+            return {"prompt_lookup_num_tokens": self.num_tokens}
+        if self.mode == "draft":
+            kwargs = {"assistant_model": self.draft_model}
+            if self.draft_tokenizer is not None:
+                kwargs["tokenizer"] = self.target_tokenizer
+                kwargs["assistant_tokenizer"] = self.draft_tokenizer
+            return kwargs
+        return {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "generations": self.generations,
+                "drafted_tokens": self.drafted,
+                "accepted_tokens": self.accepted,
+                "acceptance_rate": self.accepted / self.drafted if self.drafted else 0.0,
+            }
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from admission import Busy, FairQueue
+
+
+def test_runs_up_to_concurrency_right_away():
+    queue = FairQueue(concurrency=2)
+    tickets = [queue.enter(f"s{i}") for i in range(3)]
+    assert [ticket.granted for ticket in tickets] == [True, True, False]
+    assert queue.stats() == {"running": 2, "waiting": 1, "sessions_waiting": 1}
+
+
+def test_free_slots_go_round_robin_across_sessions():
+    queue = FairQueue(concurrency=1)
+    running = queue.enter("busy")
+    # One family clicks three times before another clicks once
+    busy = [queue.enter("busy") for _ in range(3)]
+    other = queue.enter("other")
+
+    order = []
+    for _ in range(4):
+        running.release()
+        running = next(ticket for ticket in busy + [other]
+                       if ticket.granted and ticket not in order)
+        order.append(running)
+    assert order == [busy[0], other, busy[1], busy[2]]
+
+
+def test_position_follows_round_robin_order():
+    queue = FairQueue(concurrency=1)
+    running = queue.enter("a")
+    a1, a2 = queue.enter("a"), queue.enter("a")
+    b1 = queue.enter("b")
+
+    assert running.position() == 0
+    assert [a1.position(), b1.position(), a2.position()] == [1, 2, 3]
+
+
+def test_only_waiting_requests_count_against_max_depth():
+    queue = FairQueue(concurrency=2, max_depth=1)
+    queue.enter("a")
+    queue.enter("b")
+    queue.enter("c")
+    with pytest.raises(Busy):
+        queue.enter("d")
+
+
+def test_max_depth_zero_runs_but_never_queues():
+    queue = FairQueue(concurrency=1, max_depth=0)
+    ticket = queue.enter("a")
+    assert ticket.granted
+    with pytest.raises(Busy):
+        queue.enter("b")
+    ticket.release()
+    assert queue.enter("b").granted
+
+
+def test_abandoned_ticket_leaves_the_queue():
+    queue = FairQueue(concurrency=1, max_depth=1)
+    running = queue.enter("a")
+    abandoned = queue.enter("b")
+    abandoned.release()
+    assert queue.stats() == {"running": 1, "waiting": 0, "sessions_waiting": 0}
+
+    waiting = queue.enter("c")
+    running.release()
+    assert waiting.granted
+    assert not abandoned.granted
+
+
+def test_wait_returns_once_a_slot_frees_up():
+    queue = FairQueue(concurrency=1)
+    running = queue.enter("a")
+    waiting = queue.enter("b")
+
+    thread = threading.Thread(target=waiting.wait)
+    thread.start()
+    thread.join(0.05)
+    assert thread.is_alive()
+
+    running.release()
+    thread.join(1)
+    assert not thread.is_alive()
@@ -0,0 +1,102 @@
+import io
+import os
+import random
+import shutil
+
+import pytest
+from PIL import Image
+
+from dedup_index import BKTree, DedupIndex, dedup_tree, hamming, image_hashes
+
+OUTPUT = os.path.join(os.path.dirname(__file__), "..", "images",
+                      "nature_meditation_images", "output")
+
+
+def photo(name):
+    category = name.split("_")[0]
+    with open(os.path.join(OUTPUT, category, name), "rb") as f:
+        return f.read()
+
+
+def reencoded(data, scale=2, quality=85):
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        img = img.resize((img.width // scale, img.height // scale))
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality)
+        return out.getvalue()
+
+
+@pytest.fixture
+def index():
+    return DedupIndex(":memory:")
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(0)
+    keys = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for i, key in enumerate(keys):
+        tree.add(key, i)
+    for query in keys[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        expected = sorted(i for i, key in enumerate(keys) if hamming(query, key) <= 20)
+        assert sorted(i for _, i in tree.search(query, 20)) == expected
+
+
+def test_exact_and_near_copies(index):
+    data = photo("forests_001.jpg")
+    assert index.claim(data, "a.jpg") is None
+    assert index.claim(data, "b.jpg") == "a.jpg"
+    assert index.claim(reencoded(data), "c.jpg") == "a.jpg"
+    # Claiming the kept path again is not a duplicate
+    assert index.claim(data, "a.jpg") is None
+    assert index.stats()["exact_duplicates"] == 1
+    assert index.stats()["near_duplicates"] == 1
+
+
+def test_dark_photos_are_not_near_copies(index):
+    # Similar row hashes, but clearly different pictures
+    assert index.claim(photo("sky_002.jpg"), "sky.jpg") is None
+    assert index.claim(photo("water_007.jpg"), "water_7.jpg") is None
+    assert index.claim(photo("water_009.jpg"), "water_9.jpg") is None
+
+
+def test_precomputed_hashes(index):
+    data = photo("meadows_001.jpg")
+    assert index.claim(data, "a.jpg", hashes=image_hashes(data)) is None
+    assert index.claim(data, "b.jpg", hashes=image_hashes(data)) == "a.jpg"
+
+
+def test_undecodable_data_only_matches_exactly(index):
+    assert index.claim(b"not an image", "a.jpg") is None
+    assert index.claim(b"not an image", "b.jpg") == "a.jpg"
+    assert index.claim(b"another non-image", "c.jpg") is None
+
+
+def test_release_and_prune(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.db"))
+    data = photo("sky_001.jpg")
+    kept = tmp_path / "kept.jpg"
+    kept.write_bytes(data)
+    assert index.claim(data, str(kept)) is None
+
+    index.release(str(kept))
+    assert index.claim(data, "other.jpg") is None
+    assert index.claim(data, str(kept)) == "other.jpg"
+
+    # other.jpg was never written, so pruning forgets it
+    assert index.prune("") == 1
+    assert DedupIndex(str(tmp_path / "dedup.db")).claim(data, str(kept)) is None
+
+
+def test_bundled_corpus_has_no_duplicates():
+    assert dedup_tree(OUTPUT, DedupIndex(":memory:"), dry_run=True) == []
+
+
+def test_dedup_tree_removes_later_copies(tmp_path):
+    shutil.copy(os.path.join(OUTPUT, "water", "water_001.jpg"), tmp_path / "a.jpg")
+    (tmp_path / "b.jpg").write_bytes(reencoded(photo("water_001.jpg")))
+    shutil.copy(os.path.join(OUTPUT, "water", "water_002.jpg"), tmp_path / "c.jpg")
+    duplicates = dedup_tree(str(tmp_path), DedupIndex(":memory:"))
+    assert duplicates == [(str(tmp_path / "b.jpg"), str(tmp_path / "a.jpg"))]
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "c.jpg"]
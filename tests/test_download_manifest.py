@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from download_manifest import DONE, DUPLICATE, FAILED, SAVING, DownloadManifest
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return DownloadManifest(str(tmp_path / "manifest.db"))
+
+
+def save(manifest, tmp_path, url, term, category="c"):
+    path = manifest.reserve(category, term, url, str(tmp_path), "jpg")
+    with open(path, "wb") as f:
+        f.write(url.encode())
+    manifest.finish(url, DONE, category=category, term=term)
+    return path
+
+
+def test_sequence_numbers_follow_each_other(manifest, tmp_path):
+    paths = [save(manifest, tmp_path, f"http://x/{i}", "t") for i in range(3)]
+    assert [os.path.basename(path) for path in paths] == [
+        "c_001.jpg", "c_002.jpg", "c_003.jpg"]
+    assert manifest.done("c") == 3
+
+
+def test_unsaved_last_reservation_gives_its_number_back(manifest, tmp_path):
+    manifest.reserve("c", "t", "http://x/dup", str(tmp_path), "jpg")
+    manifest.finish("http://x/dup", DUPLICATE, "duplicate", "c", "t")
+    assert os.path.basename(save(manifest, tmp_path, "http://x/1", "t")) == "c_001.jpg"
+
+
+def test_other_terms_failure_keeps_saved_image(manifest, tmp_path):
+    url = "http://x/shared"
+    path = save(manifest, tmp_path, url, "term a")
+
+    # The same URL was also a candidate of term b, whose fetch failed
+    manifest.finish(url, FAILED, "timeout", "c", "term b")
+    manifest.reserve("c", "term b", url, str(tmp_path), "jpg")
+    manifest.finish(url, DUPLICATE, f"duplicate of {path}", "c", "term b")
+
+    assert manifest.summary()["c"]["term a"] == {DONE: 1}
+    assert manifest.summary()["c"]["term b"] == {DUPLICATE: 1}
+    assert os.path.basename(save(manifest, tmp_path, "http://x/next", "term a")) == "c_002.jpg"
+
+
+def test_late_failure_does_not_undo_done(manifest, tmp_path):
+    url = "http://x/1"
+    save(manifest, tmp_path, url, "t")
+    manifest.finish(url, FAILED, "late", "c", "t")
+    assert manifest.summary()["c"]["t"] == {DONE: 1}
+
+
+def test_recover_settles_interrupted_saves(tmp_path):
+    path = str(tmp_path / "manifest.db")
+    manifest = DownloadManifest(path)
+    saved = manifest.reserve("c", "t", "http://x/1", str(tmp_path), "jpg")
+    open(saved, "wb").close()
+    manifest.reserve("c", "t", "http://x/2", str(tmp_path), "jpg")
+
+    manifest = DownloadManifest(path)
+    assert manifest.summary()["c"]["t"] == {DONE: 1}
+    assert SAVING not in manifest.summary()["c"]["t"]
+    assert os.path.basename(save(manifest, tmp_path, "http://x/3", "t")) == "c_002.jpg"
+
+
+def test_adopt_continues_after_existing_files(manifest, tmp_path):
+    for name in ("c_001.jpg", "c_004.jpg", "other.jpg"):
+        open(tmp_path / name, "wb").close()
+    manifest.adopt("c", str(tmp_path))
+    assert manifest.done("c") == 2
+    assert os.path.basename(save(manifest, tmp_path, "http://x/1", "t")) == "c_005.jpg"
+
+
+def test_known_and_needed(manifest, tmp_path):
+    save(manifest, tmp_path, "http://x/1", "t")
+    manifest.finish("http://x/2", FAILED, "404", "c", "t")
+    assert manifest.known(["http://x/1", "http://x/2", "http://x/3"]) == {
+        "http://x/1", "http://x/2"}
+    assert manifest.tried("c", "t") == 2
+    assert manifest.needed("c", "t", 3) == 2
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import html_scanner
+
+TEST_PAGE = os.path.join(os.path.dirname(__file__), "..", "helpers",
+                         "goog-img-test.html")
+
+
+@pytest.fixture(scope="module")
+def page():
+    with open(TEST_PAGE, encoding="utf-8") as f:
+        return f.read()
+
+
+def sliced(next_item, page):
+    """Image URLs found by slicing the page after each item, like ``_get_all_items``."""
+    urls = []
+    while True:
+        item, end = next_item(page)
+        if item == "no_links" or end <= 0:
+            return urls
+        urls.append(item['ou'])
+        page = page[end:]
+
+
+def test_single_pass_matches_slicing(page):
+    urls = [item['ou'] for item, _ in html_scanner.scan_items(page)]
+    assert urls
+    assert sliced(html_scanner.next_item, page) == urls
+
+
+def test_single_pass_matches_the_regex_scanner(page):
+    pytest.importorskip("google_images_download")
+    from custom_google_images_download import CustomGoogleImagesDownload
+
+    downloader = CustomGoogleImagesDownload()
+    urls = [item['ou'] for item, _ in html_scanner.scan_items(page)]
+    assert sliced(downloader._get_next_item_regex, page) == urls
+
+
+def test_records_end_past_their_url(page):
+    previous = 0
+    for item, end in html_scanner.scan_items(page):
+        assert end > previous
+        previous = end
+
+
+def test_no_links():
+    assert html_scanner.next_item("<html></html>") == ("no_links", 0)
+
+
+@pytest.mark.parametrize("url, is_src, expected", [
+    ("https://lh3.googleusercontent.com/a=s100", False,
+     "https://lh3.googleusercontent.com/a=s400"),
+    ("https://encrypted-tbn0.gstatic.com/images?q=tbn:x=s24", False, None),
+    ("/url?q=x&amp;url=https://example.com/cat.png&amp;sa=U.jpg", False,
+     "https://example.com/cat.png"),
+    ("/url?q=https://example.com/page", False, None),
+    ("https://example.com/photo.JPG?w=800", False, "https://example.com/photo.JPG?w=800"),
+    ("https://example.com/page", False, None),
+    ("https://example.com/render", True, "https://example.com/render"),
+    ("https://www.google.com/images/googlelogo.png", True, None),
+])
+def test_classify(url, is_src, expected):
+    assert html_scanner.classify(url, is_src) == expected
+
+
+def test_record_format():
+    record = html_scanner.make_record("https://example.com/a.PNG?x=1")
+    assert record['ity'] == "png"
+    assert record['ou'] == record['ru'] == record['tu']
@@ -0,0 +1,93 @@
+import functools
+import http.client
+import importlib.util
+import os
+import threading
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "js_server", os.path.join(os.path.dirname(__file__), "..", "js", "server.py"))
+server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(server)
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def connection(tmp_path):
+    (tmp_path / "model.bin").write_bytes(CONTENT)
+    (tmp_path / "empty.txt").write_bytes(b"")
+    (tmp_path / "app.js").write_bytes(b"console.log(1)")
+    handler = functools.partial(server.Handler, directory=str(tmp_path))
+    httpd = server.Server(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    # One keep-alive connection, so a request that breaks it shows up
+    connection = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    yield connection
+    connection.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(connection, path, **headers):
+    connection.request("GET", path, headers=headers)
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def test_whole_file(connection):
+    response, body = get(connection, "/model.bin")
+    assert response.status == 200
+    assert body == CONTENT
+    assert response.getheader("Accept-Ranges") == "bytes"
+    assert response.getheader("Cache-Control") == server.IMMUTABLE_CACHE_CONTROL
+
+
+def test_empty_file_keeps_connection_alive(connection):
+    response, body = get(connection, "/empty.txt")
+    assert response.status == 200
+    assert body == b""
+    assert response.getheader("Content-Length") == "0"
+    response, body = get(connection, "/app.js")
+    assert response.status == 200
+    assert body == b"console.log(1)"
+    assert response.getheader("Cache-Control") == server.REVALIDATE_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1020-5000", 1020, 1023),
+])
+def test_ranges(connection, header, start, end):
+    response, body = get(connection, "/model.bin", Range=header)
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert body == CONTENT[start:end + 1]
+
+
+def test_unsatisfiable_range(connection):
+    response, body = get(connection, "/model.bin", Range="bytes=5000-")
+    assert response.status == 416
+    assert response.getheader("Content-Range") == f"bytes */{len(CONTENT)}"
+    assert body == b""
+
+
+def test_stale_if_range_gets_whole_file(connection):
+    response, body = get(connection, "/model.bin", Range="bytes=0-9",
+                         **{"If-Range": '"stale"'})
+    assert response.status == 200
+    assert body == CONTENT
+
+
+def test_etag_revalidation(connection):
+    response, _ = get(connection, "/model.bin")
+    etag = response.getheader("ETag")
+    response, body = get(connection, "/model.bin", **{"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+    response, _ = get(connection, "/model.bin", Range="bytes=0-9", **{"If-Range": etag})
+    assert response.status == 206
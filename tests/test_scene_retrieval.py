@@ -0,0 +1,69 @@
+import glob
+import os
+
+import pytest
+
+from activity_catalog import Activity, parse_catalog
+from scene_retrieval import SCENE_ACTIVITIES, ActivityRetriever, classify_scene
+
+IMAGES = os.path.join(os.path.dirname(__file__), "..", "images")
+NATURE_PHOTOS = sorted(glob.glob(os.path.join(IMAGES, "nature_meditation_images/output/*/*.jpg")))
+INDOOR_PHOTOS = sorted(glob.glob(os.path.join(IMAGES, "*.jp*g")))
+
+PROMPT = "Pick two.\n\n<activities>\n{}\n</activities>\n\nBe kind."
+CATALOG = [Activity(number, f"Activity {number}", {"Focus": f"focus {number}"})
+           for number in range(1, 21)]
+
+
+@pytest.mark.parametrize("description, scene", [
+    ("We are at the park.", "nature"),
+    ("On the subway!", "transit"),
+    ("stuck in traffic, again", "transit"),
+    ("Waiting for our trains", "transit"),
+    ("Working from home today", "indoor"),
+    ("Feeling tired", None),
+    ("", None),
+    (None, None),
+])
+def test_description_keywords(description, scene):
+    assert classify_scene(None, description) == scene
+
+
+def test_description_wins_over_photo():
+    assert classify_scene(NATURE_PHOTOS[0], "in the office") == "indoor"
+
+
+def test_most_nature_photos_are_nature():
+    nature = [path for path in NATURE_PHOTOS if classify_scene(path) == "nature"]
+    assert len(nature) >= 0.6 * len(NATURE_PHOTOS)
+
+
+@pytest.mark.parametrize("path", INDOOR_PHOTOS)
+def test_indoor_photos_are_never_nature(path):
+    # Photos alone are never indoor or transit: unclear ones get the catalog
+    assert classify_scene(path) is None
+
+
+def test_activities_for_scene_follow_ranking():
+    retriever = ActivityRetriever(CATALOG, top_k=3)
+    assert ([activity.number for activity in retriever.activities_for("transit")] ==
+            SCENE_ACTIVITIES["transit"][:3])
+    assert retriever.activities_for(None) == CATALOG
+
+
+def test_prompt_for_lists_only_scene_activities():
+    prompt = PROMPT.format("\n".join(activity.to_prompt() for activity in CATALOG))
+    retriever = ActivityRetriever(CATALOG, top_k=4)
+    restricted = retriever.prompt_for(prompt, "indoor")
+    assert ([activity.number for activity in parse_catalog(restricted)] ==
+            SCENE_ACTIVITIES["indoor"][:4])
+    assert restricted.endswith("Be kind.")
+    assert retriever.prompt_for(prompt, None) is prompt
+    assert "ACTIVITIES:" in retriever.prompt_for(prompt, None, structured=True)
+
+
+def test_record_counts_tokens():
+    retriever = ActivityRetriever(CATALOG, count_tokens=lambda text: len(text.split()))
+    assert retriever.record("a b c d", "a b") == (4, 2)
+    assert retriever.stats()["saved_tokens"] == 2
+    assert ActivityRetriever(CATALOG).record("a b", "a") is None
@@ -0,0 +1,72 @@
+import pytest
+
+from session_store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(str(tmp_path / "sessions.db"), flush_seconds=0.01)
+
+
+def all_pages(query, browser_id, limit):
+    rows, cursor = query(browser_id, limit=limit)
+    pages = [rows]
+    while cursor is not None:
+        rows, cursor = query(browser_id, cursor, limit=limit)
+        pages.append(rows)
+    return pages
+
+
+def test_history_pages_cover_every_session_once_newest_first(store):
+    ids = [store.record_session(f"r{i}", browser_id="a") for i in range(7)]
+    store.flush()
+
+    pages = all_pages(store.history, "a", limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    rows = [row for page in pages for row in page]
+    assert sorted(row["id"] for row in rows) == sorted(ids)
+    keys = [(row["created_at"], row["id"]) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_full_last_page_is_followed_by_an_empty_one(store):
+    for i in range(4):
+        store.record_session(f"r{i}", browser_id="a")
+    store.flush()
+
+    pages = all_pages(store.history, "a", limit=2)
+    assert [len(page) for page in pages] == [2, 2, 0]
+
+
+def test_each_browser_only_sees_its_own_sessions(store):
+    mine = store.record_session("mine", browser_id="a")
+    store.record_session("theirs", browser_id="b")
+    store.record_session("nobody's")
+    store.flush()
+
+    rows, cursor = store.history("a")
+    assert [row["id"] for row in rows] == [mine]
+    assert cursor is None
+
+
+def test_favorites_are_sessions_that_helped(store):
+    better = store.record_session("better", browser_id="a")
+    worse = store.record_session("worse", browser_id="a")
+    store.record_session("no feedback", browser_id="a")
+    store.record_feedback(better, "better")
+    store.record_feedback(worse, "worse")
+    store.flush()
+
+    rows, _ = store.favorites("a")
+    assert [row["id"] for row in rows] == [better]
+    assert rows[0]["feedback"] == "better"
+
+
+def test_bad_write_only_drops_itself(store):
+    good = store.record_session("good", browser_id="a")
+    store.write(("INSERT INTO missing_table VALUES (?)", (1,)))
+    also_good = store.record_session("also good", browser_id="a")
+    store.flush()
+
+    rows, _ = store.history("a")
+    assert {row["id"] for row in rows} == {good, also_good}
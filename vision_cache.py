@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+import metrics
+
+
+class VisionEmbeddingCache:
+    """
+    Bounded LRU cache of vision tower outputs, keyed by a hash of each
+    image's pixel values and the model revision.
+
+    ``install`` wraps the model's ``get_image_features`` so ``generate``
+    reuses embeddings for images it has already encoded (retries, follow-up
+    questions, new descriptions for the same photo) and only runs the vision
+    tower for new ones.
+    """
+
+    def __init__(self, revision, max_bytes=256 * 1024 * 1024):
+        self.revision = revision
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def install(self, model):
+        """Route ``model``'s image feature extraction through the cache."""
+        vision_model = model.model
+        get_image_features = vision_model.get_image_features
+
+        def cached_get_image_features(pixel_values, *args, **kwargs):
+            return self.get_or_compute(
+                pixel_values,
+                lambda missing: get_image_features(missing, *args, **kwargs)
+            )
+
+        vision_model.get_image_features = cached_get_image_features
+
+    def _key(self, pixels):
+        digest = hashlib.sha256(self.revision.encode())
+        digest.update(pixels.detach().contiguous().cpu().view(torch.uint8).numpy())
+        return digest.hexdigest()
+
+    def get_or_compute(self, pixel_values, compute):
+        """
+        Return embeddings for a batch of images, calling ``compute`` once
+        with only the images that aren't cached yet.
+        """
+        keys = [self._key(pixels) for pixels in pixel_values]
+        embeddings = [None] * len(keys)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    embeddings[i] = self._entries[key]
+                    self.hits += 1
+                    metrics.VISION_CACHE.inc(result="hit")
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = compute(pixel_values[missing])
+            with self._lock:
+                self.misses += len(missing)
+                metrics.VISION_CACHE.inc(len(missing), result="miss")
+                for i, embedding in zip(missing, computed):
+                    embeddings[i] = embedding
+                    self._store(keys[i], embedding.detach())
+
+        return torch.stack(embeddings)
+
+    def _store(self, key, embedding):
+        if key in self._entries:
+            return
+        self._entries[key] = embedding
+        self._bytes += embedding.numel() * embedding.element_size()
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.numel() * evicted.element_size()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
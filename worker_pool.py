@@ -0,0 +1,171 @@
+import base64
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+
+class NoWorkerAvailable(Exception):
+    """Raised when every worker failed or is unreachable."""
+
+
+class WorkerUnavailable(Exception):
+    """Raised when a worker answers 503, e.g. while it is still loading."""
+
+
+# Failures that say nothing about the request itself, so another worker
+# may well succeed. Other HTTP errors (a 500 from a bad upload) would fail
+# the same way everywhere and go straight to the caller.
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, WorkerUnavailable)
+
+
+class Worker:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.healthy = False
+        self.in_flight = 0
+        self.failures = 0
+
+
+class WorkerPool:
+    """
+    Client for a pool of inference workers (``python gemma_server.py
+    --port N``).
+
+    Requests go to the healthy worker with the fewest requests in flight. A
+    background thread health-checks every worker, and a request that fails
+    on one worker because it is down, timed out or answered 503 is retried
+    on the next, so workers can be restarted without taking the UI down.
+    Other HTTP errors are raised to the caller. Turns of the same session
+    stick to one worker while it is healthy, so follow-ups can reuse its KV
+    cache.
+    """
+
+    # Sessions whose worker is remembered
+    MAX_SESSIONS = 10000
+
+    def __init__(self, urls, timeout=300, retries=2, health_interval=5):
+        self.workers = [Worker(url) for url in urls]
+        self.timeout = timeout
+        self.retries = retries
+        self.health_interval = health_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._health_thread = threading.Thread(target=self._check_health, daemon=True)
+        self._health_thread.start()
+
+    def _check_health(self):
+        while True:
+            for worker in self.workers:
+                try:
+                    response = requests.get(f"{worker.url}/health", timeout=2)
+                    worker.healthy = response.status_code == 200
+                except requests.RequestException:
+                    worker.healthy = False
+            time.sleep(self.health_interval)
+
+    def ready(self):
+        return any(worker.healthy for worker in self.workers)
+
+    def _candidates(self, session_id=None):
+        """
+        Workers in the order to try them: the session's own worker if it is
+        healthy, then healthy and least busy first.
+        """
+        with self._lock:
+            pinned = self._sessions.get(session_id)
+            return sorted(self.workers, key=lambda worker: (
+                not worker.healthy, not (worker is pinned), worker.in_flight))
+
+    def _pin(self, session_id, worker):
+        if session_id is None:
+            return
+        with self._lock:
+            self._sessions[session_id] = worker
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    def _payload(self, request):
+        files = {"image_path": "image", "audio_path": "audio"}
+        payload = {key: value for key, value in request.items() if key not in files}
+        for key, field in files.items():
+            if request.get(key):
+                with open(request[key], "rb") as f:
+                    payload[field] = base64.b64encode(f.read()).decode("ascii")
+        return payload
+
+    @contextlib.contextmanager
+    def _in_flight(self, worker):
+        with self._lock:
+            worker.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                worker.in_flight -= 1
+
+    def _post(self, worker, path, payload, stream=False):
+        try:
+            response = requests.post(f"{worker.url}{path}", json=payload,
+                                     timeout=self.timeout, stream=stream)
+            if response.status_code == 503:
+                response.close()
+                raise WorkerUnavailable(f"{worker.url} answered 503")
+        except RETRYABLE_ERRORS:
+            worker.healthy = False
+            worker.failures += 1
+            raise
+        response.raise_for_status()
+        return response
+
+    def call(self, request):
+        """Blocking generation; returns the response text."""
+        payload = self._payload(request)
+        errors = []
+        for worker in self._candidates(request.get("session_id"))[:self.retries + 1]:
+            try:
+                with self._in_flight(worker):
+                    text = self._post(worker, "/generate", payload).json()["text"]
+                self._pin(request.get("session_id"), worker)
+                return text
+            except RETRYABLE_ERRORS as e:
+                print(f"Worker {worker.url} failed, retrying: {e}")
+                errors.append(e)
+        raise NoWorkerAvailable(errors)
+
+    def stream(self, request):
+        """
+        Yield text deltas as the worker generates them. A worker that fails
+        before sending anything is retried; a failure mid-stream is raised.
+        """
+        payload = self._payload(request)
+        errors = []
+        for worker in self._candidates(request.get("session_id"))[:self.retries + 1]:
+            with self._in_flight(worker):
+                try:
+                    response = self._post(worker, "/stream", payload, stream=True)
+                except RETRYABLE_ERRORS as e:
+                    print(f"Worker {worker.url} failed, retrying: {e}")
+                    errors.append(e)
+                    continue
+
+                self._pin(request.get("session_id"), worker)
+                with response:
+                    for text in response.iter_content(chunk_size=None,
+                                                      decode_unicode=True):
+                        if text:
+                            yield text
+                return
+        raise NoWorkerAvailable(errors)
+
+    def stats(self):
+        with self._lock:
+            return [{
+                "url": worker.url,
+                "healthy": worker.healthy,
+                "in_flight": worker.in_flight,
+                "failures": worker.failures,
+            } for worker in self.workers]